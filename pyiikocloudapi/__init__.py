@@ -1,4 +1,19 @@
 from .api import IikoTransport
+from .async_api import AsyncIikoTransport
+from .cache import ResponseCache, CachePolicy
+from .codec import JsonCodec, OrjsonCodec
+from .couriers import CourierRegistry
+from .instrumentation import RequestLogger, ResponseRetention, RETENTION_OFF
+from .nomenclature import NomenclatureCache, NomenclatureIndex, NomenclatureDiff, diff_nomenclature, \
+    nomenclature_columns, columns_to_numpy
+from .orders import OrderIndex, OrderChangeFeed, by_delivery_date_and_status_sharded
+from .pool import PoolConfig
+from .rate_limit import RateLimiter, RateLimit
+from .retry import RetryPolicy, RetryRules, NO_RETRY
+from .snapshot import SnapshotStore
+from .streets import StreetDirectory, StreetIndex
+from .token_store import BaseTokenStore, MemoryTokenStore, FileTokenStore
+from .topology import Topology, TopologyCache, TopologyChange
 from .models import *
 # import biz
 # import card
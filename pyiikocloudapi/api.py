@@ -1,26 +1,55 @@
 import datetime
+import inspect
 import json
 import logging
 import pprint
+import threading
+import time
 import uuid
+import weakref
+from collections import deque
 from datetime import date, timedelta
 from datetime import datetime
+from typing import Tuple, Iterator
 
 import requests
 
-from pyiikocloudapi.decorators import experimental
+from pyiikocloudapi.cache import ResponseCache
+from pyiikocloudapi.codec import JsonCodec, get_default_codec
+from pyiikocloudapi.decorators import experimental, cached_response
 from pyiikocloudapi.exception import CheckTimeToken, SetSession, TokenException, PostException, ParamSetException
+from pyiikocloudapi.instrumentation import Preview, RequestLogger, ResponseRetention, RetainedResponse
 from pyiikocloudapi.models import *
+from pyiikocloudapi.nomenclature import NomenclatureCache
+from pyiikocloudapi.pool import PoolConfig, pool_stats
+from pyiikocloudapi.rate_limit import RateLimiter
+from pyiikocloudapi.retry import RetryRules, RetryPolicy
+from pyiikocloudapi.streaming import OrderStreamParser, STREAM_CHUNK_SIZE, resolve_fields, project
+from pyiikocloudapi.token_store import BaseTokenStore
 
 
 class BaseAPI:
     DEFAULT_TIMEOUT = "15"
+    # таймаут установки соединения, сек.
+    CONNECT_TIMEOUT = 10
+    # запас ко времени ожидания ответа сверх iiko Timeout на сетевые задержки, сек.
+    READ_TIMEOUT_MARGIN = 5
+    # маркер живёт ~60 минут, фоновое обновление запрашивает новый заранее, сек.
+    TOKEN_REFRESH_INTERVAL = 45 * 60
+    # пауза перед повтором фонового обновления после ошибки, сек.
+    TOKEN_REFRESH_RETRY_INTERVAL = 30
 
     # __BASE_URL = "https://api-ru.iiko.services"
 
     def __init__(self, api_login: str, session: Optional[requests.Session] = None, debug: bool = False,
                  base_url: str = None, working_token: str = None, base_headers: dict = None, logger: Optional[
-            logging.Logger] = None, return_dict: bool = False, *args, **kwargs):
+            logging.Logger] = None, return_dict: bool = False, auto_refresh_token: bool = False,
+                 token_store: Optional[BaseTokenStore] = None, lazy_token: bool = False,
+                 pool: Optional[PoolConfig] = None, retry_rules: Optional[RetryRules] = None,
+                 rate_limiter: Optional[RateLimiter] = None, codec: Optional[JsonCodec] = None,
+                 request_logger: Optional[RequestLogger] = None, retention: Optional[ResponseRetention] = None,
+                 nomenclature_cache: Optional[NomenclatureCache] = None,
+                 response_cache: Optional[ResponseCache] = None, *args, **kwargs):
         """
 
         :param api_login: login api iiko cloud
@@ -31,12 +60,26 @@ class BaseAPI:
         :param base_headers: base header for request in iiko cloud api
         :param logger: your object Logger
         :param return_dict: return a dictionary instead of models
+        :param auto_refresh_token: refresh the token in the background every TOKEN_REFRESH_INTERVAL seconds
+        :param token_store: shared token storage (MemoryTokenStore, FileTokenStore or your own BaseTokenStore)
+        :param lazy_token: do not request the token in the constructor, it will be requested on the first request
+        :param pool: connection pool settings for the session
+        :param retry_rules: retry policies per endpoint, by default reads are retried and writes are not
+        :param rate_limiter: client-side limits per iiko restriction group, can be shared between clients
+        :param codec: JSON codec for request and response bodies, orjson when installed by default
+        :param request_logger: request/response logging settings (body preview size, sampling)
+        :param retention: what to keep from recent responses: last_data on/off, size cap, ring buffer
+        :param nomenclature_cache: nomenclature snapshots per organization for nomenclature_cached
+        :param response_cache: TTL cache for Dictionaries methods, disabled by default
         """
 
         if session is not None:
             self.__session = session
         else:
             self.__session = requests.Session()
+        self.__pool = pool
+        if pool is not None:
+            pool.mount(self.__session)
 
         self.__api_login = api_login
         self.__token: Optional[str] = None
@@ -45,24 +88,41 @@ class BaseAPI:
         self.__organizations_ids_model: Optional[BaseOrganizationsModel] = None
         self.__organizations_ids: Optional[List[str]] = None
         self.__strfdt = "%Y-%m-%d %H:%M:%S.000"
+        self.__codec = codec if codec is not None else get_default_codec(self.__strfdt)
         self.__return_dict = return_dict
         self.logger = logger if logger is not None else logging.getLogger()
+        self.__request_logger = request_logger if request_logger is not None else RequestLogger()
 
         self.__base_url = "https://api-ru.iiko.services" if base_url is None else base_url
         self.__headers = {
             "Content-Type": "application/json",
             "Timeout": "45",
         } if base_headers is None else base_headers
-        self.__set_token(working_token) if working_token is not None else self.__get_access_token()
-        # if working_token is not None:
-        #     self.__set_token(working_token)
-        # else:
-        #     self.__get_access_token()
+        self.__token_lock = threading.RLock()
+        self.__auto_refresh_token = auto_refresh_token
+        self.__refresh_timer: Optional[threading.Timer] = None
+        self.__token_store = token_store
+        self.__lazy_token = lazy_token
+        self.__retry_rules = retry_rules if retry_rules is not None else RetryRules()
+        self.__rate_limiter = rate_limiter
+        self._init_token(working_token)
         self.__last_data = None
+        self.__last_content: Optional[bytes] = None
+        self.__retention = retention if retention is not None else ResponseRetention()
+        self.__response_history = deque(maxlen=self.__retention.history)
+        self.__nomenclature_cache = nomenclature_cache if nomenclature_cache is not None else NomenclatureCache()
+        self.__response_cache = response_cache
+
+    def _init_token(self, working_token: Optional[str] = None):
+        """Первичная установка маркера доступа при создании объекта"""
+        if working_token is not None:
+            self._set_token(working_token)
+        elif not self.__lazy_token:
+            self.__get_access_token()
 
     def check_status_code_token(self, code: Union[str, int]):
         if str(code) == "401":
-            self.__get_access_token()
+            self.__get_access_token(stale_token=self.__token)
         elif str(code) == "400":
             pass
         elif str(code) == "408":
@@ -80,7 +140,7 @@ class BaseAPI:
         try:
 
             if time_token <= fifteen_minutes_ago:
-                self.__get_access_token()
+                self.__get_access_token(stale_token=self.__token)
                 return True
             else:
                 return False
@@ -100,8 +160,33 @@ class BaseAPI:
 
     @property
     def last_data(self) -> Optional[List[str]]:
+        # тело последнего ответа, разобранного сразу в модель, декодируется только при обращении
+        if self.__last_data is None and self.__last_content is not None:
+            self.__last_data = self.__codec.loads(self.__last_content)
+            self.__last_content = None
         return self.__last_data
 
+    @property
+    def nomenclature_cache(self) -> NomenclatureCache:
+        return self.__nomenclature_cache
+
+    @property
+    def response_cache(self) -> Optional[ResponseCache]:
+        return self.__response_cache
+
+    @response_cache.setter
+    def response_cache(self, value: Optional[ResponseCache]):
+        self.__response_cache = value
+
+    @property
+    def retention(self) -> ResponseRetention:
+        return self.__retention
+
+    @property
+    def response_history(self) -> List[RetainedResponse]:
+        """Последние сырые ответы (url, status_code, content), если включены в retention.history"""
+        return list(self.__response_history)
+
     @property
     def session_s(self) -> requests.Session:
         """Вывести сессию"""
@@ -117,6 +202,36 @@ class BaseAPI:
                 f"Не присвоен объект типа requests.Session")
         else:
             self.__session = session
+            if self.__pool is not None:
+                self.__pool.mount(session)
+
+    @property
+    def pool(self) -> Optional[PoolConfig]:
+        return self.__pool
+
+    @property
+    def retry_rules(self) -> RetryRules:
+        return self.__retry_rules
+
+    @retry_rules.setter
+    def retry_rules(self, value: RetryRules):
+        self.__retry_rules = value
+
+    @property
+    def rate_limiter(self) -> Optional[RateLimiter]:
+        return self.__rate_limiter
+
+    @rate_limiter.setter
+    def rate_limiter(self, value: Optional[RateLimiter]):
+        self.__rate_limiter = value
+
+    def pool_stats(self) -> List[dict]:
+        """Статистика пула соединений с base_url (см. pyiikocloudapi.pool.pool_stats)"""
+        return pool_stats(self.__session.get_adapter(self.__base_url))
+
+    @property
+    def debug(self) -> bool:
+        return self.__debug
 
     @property
     def time_token(self):
@@ -145,6 +260,15 @@ class BaseAPI:
     @strfdt.setter
     def strfdt(self, value: str):
         self.__strfdt = value
+        self.__codec.datetime_format = value
+
+    @property
+    def codec(self) -> JsonCodec:
+        return self.__codec
+
+    @property
+    def request_logger(self) -> RequestLogger:
+        return self.__request_logger
 
     @property
     def headers(self):
@@ -174,16 +298,68 @@ class BaseAPI:
     def timeout(self):
         self.__headers.update({"Timeout": str(self.DEFAULT_TIMEOUT)})
 
-    def __set_token(self, token):
+    def _request_headers(self, timeout=DEFAULT_TIMEOUT) -> dict:
+        """Заголовки одного запроса, общие self.headers не изменяются"""
+        headers = dict(self.__headers)
+        if timeout != self.DEFAULT_TIMEOUT:
+            headers["Timeout"] = str(timeout)
+        return headers
+
+    def _request_timeout(self, timeout=DEFAULT_TIMEOUT):
+        """(connect, read) для requests: ответа ждём iiko Timeout плюс READ_TIMEOUT_MARGIN"""
+        iiko_timeout = timeout if timeout != self.DEFAULT_TIMEOUT else self.timeout or timeout
+        return self.CONNECT_TIMEOUT, float(iiko_timeout) + self.READ_TIMEOUT_MARGIN
+
+    @property
+    def auto_refresh_token(self) -> bool:
+        return self.__auto_refresh_token
+
+    @property
+    def token_store(self) -> Optional[BaseTokenStore]:
+        return self.__token_store
+
+    def _set_token(self, token, issued_at: Optional[datetime] = None):
         self.__token = token
         self.__headers["Authorization"] = f"Bearer {self.token}"
-        self.__time_token = datetime.now()
+        self.__time_token = datetime.now() if issued_at is None else issued_at
+        if self.__auto_refresh_token:
+            age = (datetime.now() - self.__time_token).total_seconds()
+            self._schedule_token_refresh(max(self.TOKEN_REFRESH_INTERVAL - age, 0))
+
+    def _schedule_token_refresh(self, delay: float):
+        """Запланировать фоновое обновление маркера доступа через delay секунд"""
+        self.stop_token_refresh()
+        # таймер держит только слабую ссылку, чтобы не мешать сборке мусора клиента
+        self_ref = weakref.ref(self)
+
+        def refresh():
+            api = self_ref()
+            if api is not None:
+                api._background_token_refresh()
+
+        self.__refresh_timer = threading.Timer(delay, refresh)
+        self.__refresh_timer.daemon = True
+        self.__refresh_timer.start()
+
+    def _background_token_refresh(self):
+        try:
+            self.__get_access_token(stale_token=self.__token)
+        except Exception as err:
+            self.logger.warning(f"Не удалось обновить маркер доступа в фоне: {err}")
+            self._schedule_token_refresh(self.TOKEN_REFRESH_RETRY_INTERVAL)
+
+    def stop_token_refresh(self):
+        """Остановить фоновое обновление маркера доступа"""
+        timer, self.__refresh_timer = self.__refresh_timer, None
+        if timer is not None:
+            timer.cancel()
 
     def access_token(self):
         """Получить маркер доступа"""
         data = json.dumps({"apiLogin": self.api_login})
         try:
-            result = self.session_s.post(f'{self.__base_url}/api/1/access_token', json=data)
+            result = self.session_s.post(f'{self.__base_url}/api/1/access_token', json=data,
+                                         timeout=self._request_timeout())
 
             response_data: dict = json.loads(result.content)
             if response_data.get("errorDescription", None) is not None:
@@ -191,7 +367,7 @@ class BaseAPI:
 
             if response_data.get("token", None) is not None:
                 self.check_status_code_token(result.status_code)
-                self.__set_token(response_data.get("token", ""))
+                self._set_token(response_data.get("token", ""))
 
         except requests.exceptions.RequestException as err:
             raise TokenException(self.__class__.__qualname__,
@@ -206,46 +382,242 @@ class BaseAPI:
                       model_error=CustomErrorModel):
         if data is None:
             data = {}
-        if timeout != self.DEFAULT_TIMEOUT:
-            self.timeout = timeout
-        self.logger.info(f"{url=}, {data=}, {model_response_data=}, {model_error=}")
-        response = self.session_s.post(f'{self.base_url}{url}', data=json.dumps(data),
-                                       headers=self.headers)
-        if response.status_code == 401:
+        if self.__token is None:
             self.__get_access_token()
-            return self._post_request(url=url, data=data, timeout=timeout, model_response_data=model_response_data,
-                                      model_error=model_error)
+        body = self.__codec.dumps(data)
+        sampled = self.__request_logger.sampled(self.logger)
+        if sampled:
+            self.__request_logger.request(self.logger, url, body)
+        started = time.perf_counter()
+        response = self.__send(url, body, timeout, self.__retry_rules.for_url(url))
+        if sampled and self.__debug:
+            self.__request_logger.response(self.logger, url, response.status_code, response.content,
+                                           time.perf_counter() - started)
+        return self._parse_response(response.status_code, response.content, model_response_data, model_error,
+                                    url=url)
+
+    def __send(self, url: str, body: bytes, timeout, policy: RetryPolicy, stream: bool = False) -> requests.Response:
+        """
+        Отправить запрос с повторами по policy.
+        После 401 маркер обновляется и запрос повторяется один раз, эта попытка не считается.
+        Каждая попытка, включая повторы, проходит через rate_limiter.
+        При stream=True тело ответа не читается, ответ нужно закрыть (response.close()).
+        """
+        attempt = 1
+        token_refreshed = False
+        while True:
+            if self.__rate_limiter is not None:
+                self.__rate_limiter.acquire(self.__api_login, url)
+            used_token = self.__token
+            try:
+                response = self.session_s.post(f'{self.base_url}{url}', data=body,
+                                               headers=self._request_headers(timeout),
+                                               timeout=self._request_timeout(timeout), stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as err:
+                if not policy.retry_error(attempt):
+                    raise
+                delay = policy.delay(attempt)
+                reason = repr(err)
+            else:
+                if response.status_code == 401 and not token_refreshed:
+                    response.close()
+                    self.__get_access_token(stale_token=used_token)
+                    token_refreshed = True
+                    continue
+                if not policy.retry_status(response.status_code, attempt):
+                    return response
+                response.close()
+                delay = policy.delay(attempt, response.headers.get("Retry-After"))
+                reason = f"status_code={response.status_code}"
+            self.logger.warning("%s: попытка %d не удалась (%s), повтор через %.2f сек.", url, attempt, reason, delay)
+            time.sleep(delay)
+            attempt += 1
+
+    def _stream_orders(self, url: str, data: dict, timeout=DEFAULT_TIMEOUT,
+                       fields: Optional[List[str]] = None) -> Iterator[Union[ByOrderItemModel, dict]]:
+        """
+        Заказы из ответа url по одному, по мере чтения тела (в памяти только текущий заказ).
+        Ответ не попадает в last_data и response_history; ошибка iiko или оборванный ответ - PostException.
+        """
+        resolved = resolve_fields(fields) if fields is not None else None
+        if self.__token is None:
+            self.__get_access_token()
+        body = self.__codec.dumps(data)
+        if self.__request_logger.sampled(self.logger):
+            self.__request_logger.request(self.logger, url, body)
+        try:
+            response = self.__send(url, body, timeout, self.__retry_rules.for_url(url), stream=True)
+        except requests.exceptions.RequestException as err:
+            raise PostException(self.__class__.__qualname__, self._stream_orders.__name__,
+                                f"Не удалось выполнить запрос {url}: \n{err}")
+        try:
+            if response.status_code != 200:
+                self._stream_failed(url, response.status_code, response.content)
+            parser = OrderStreamParser()
+            for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+                for raw in parser.feed(chunk):
+                    yield self._stream_item(raw, resolved)
+            self._stream_finished(url, parser)
+        except requests.exceptions.RequestException as err:
+            raise PostException(self.__class__.__qualname__, self._stream_orders.__name__,
+                                f"Не удалось дочитать ответ {url}: \n{err}")
+        finally:
+            response.close()
+
+    def _stream_item(self, raw: bytes, fields=None):
+        """Заказ из байтов: выбранные поля (dict), dict при return_dict или ByOrderItemModel"""
+        if fields is not None:
+            return project(self.__codec.loads(raw), fields)
+        if self.__return_dict:
+            return self.__codec.loads(raw)
+        return ByOrderItemModel.model_validate_json(raw)
 
-        if self.__debug:
+    def _stream_failed(self, url: str, status_code: int, content: bytes):
+        try:
+            error = self._parse_response(status_code, content, url=url)
+        except (ValueError, AttributeError):
+            # не JSON-объект, например html-страница 502 от прокси
+            error = Preview(content, 1024)
+        raise PostException(self.__class__.__qualname__, self._stream_orders.__name__,
+                            f"Не удалось получить заказы {url}, status_code={status_code}: \n{error}")
+
+    def _stream_finished(self, url: str, parser: OrderStreamParser):
+        if "errorDescription" in parser.scalars:
             try:
+                description = self.__codec.loads(parser.scalars["errorDescription"])
+            except ValueError:
+                description = parser.scalars["errorDescription"].decode("utf-8", "replace")
+            raise PostException(self.__class__.__qualname__, self._stream_orders.__name__,
+                                f"Не удалось получить заказы {url}: \n{description}")
+        if not parser.done:
+            raise PostException(self.__class__.__qualname__, self._stream_orders.__name__,
+                                f"Ответ {url} оборван")
+
+    @staticmethod
+    def _then(result, callback):
+        """
+        Применить callback к результату метода; в асинхронном клиенте результат — корутина.
+        Если callback сам вернул корутину (следующий запрос), она тоже дожидается.
+        """
+        if inspect.isawaitable(result):
+            async def wait():
+                value = callback(await result)
+                if inspect.isawaitable(value):
+                    value = await value
+                return value
+
+            return wait()
+        return callback(result)
+
+    def _ready(self, value):
+        """Готовое значение в виде результата метода (в асинхронном клиенте — корутина)"""
+        return value
 
-                self.logger.debug(
-                    f"Входные данные:\n{response.request.url=}\n{response.request.body=}\n{response.request.headers=}\n\nВыходные данные:\n{response.headers=}\n{response.content=}\n\n")
+    def _background(self, call, finish=None):
+        """Выполнить call() в фоновом потоке, ошибку записать в лог, в конце вызвать finish()"""
+
+        def run():
+            try:
+                call()
             except Exception as err:
-                self.logger.debug(f"{err=}")
-        response_data: dict = json.loads(response.content)
-        self.__last_data = response_data
+                self.logger.warning("Фоновый запрос не удался: %s", err)
+            finally:
+                if finish is not None:
+                    finish()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def _parse_response(self, status_code: int, content: bytes, model_response_data=None,
+                        model_error=CustomErrorModel, url: Optional[str] = None):
+        """Разбор тела ответа в модель (общий для синхронного и асинхронного клиента)"""
+        keep_last = self.__retain_response(url, status_code, content)
+        if model_response_data is not None and not self.__return_dict and b'"errorDescription"' not in content:
+            # быстрый путь: pydantic-core валидирует байты в модель без промежуточного dict
+            return model_response_data.model_validate_json(content)
+        response_data: dict = self.__codec.loads(content)
+        if keep_last:
+            self.__last_data = response_data
+            self.__last_content = None
         if response_data.get("errorDescription", None) is not None:
             error_model = model_error.parse_obj(response_data)
-            error_model.status_code = response.status_code
+            error_model.status_code = status_code
             return error_model
         if self.__return_dict:
             return response_data
         if model_response_data is not None:
             return model_response_data.parse_obj(response_data)
-        del self.timeout
         return response_data
 
-    def __get_access_token(self):
+    def __retain_response(self, url: Optional[str], status_code: int, content: bytes) -> bool:
+        """Запомнить ответ согласно retention, вернуть True, если он стал last_data"""
+        if self.__response_history.maxlen != self.__retention.history:
+            self.__response_history = deque(self.__response_history, maxlen=self.__retention.history)
+        if self.__retention.history:
+            self.__response_history.append(RetainedResponse(url, status_code, content))
+        keep_last = self.__retention.keep_last(content)
+        self.__last_data = None
+        self.__last_content = content if keep_last else None
+        return keep_last
+
+    def __get_access_token(self, stale_token: Optional[str] = None):
+        # Потоки, одновременно получившие 401 (или первыми запросившие маркер при lazy_token), ждут один
+        # запрос маркера: если пока ждали lock маркер уже появился или сменился, повторно его не запрашиваем.
+        with self.__token_lock:
+            if self.__token is not None and self.__token != stale_token:
+                return
+            if self.__token_store is None:
+                self.__request_access_token()
+                return
+            with self.__token_store.lock(self.api_login):
+                if self._use_stored_token(self.__token_store.get(self.api_login), stale_token):
+                    return
+                self.__request_access_token()
+                self._save_stored_token()
+
+    def __request_access_token(self):
         out = self.access_token()
         if isinstance(out, CustomErrorModel):
             raise TokenException(self.__class__.__qualname__,
                                  self.access_token.__name__,
                                  f"Не удалось получить маркер доступа: \n{out}")
 
+    def _use_stored_token(self, stored: Optional[Tuple[str, float]], stale_token: Optional[str] = None) -> bool:
+        """Взять маркер из token_store, если он ещё свежий и не тот, что уже отклонён сервером"""
+        if stored is None:
+            return False
+        token, issued_at = stored
+        if token == stale_token or time.time() - issued_at >= self.TOKEN_REFRESH_INTERVAL:
+            return False
+        self._set_token(token, issued_at=datetime.fromtimestamp(issued_at))
+        return True
+
+    def _save_stored_token(self):
+        if self.__token is not None:
+            self.__token_store.set(self.api_login, self.__token, self.__time_token.timestamp())
+
     def __convert_org_data(self, data: BaseOrganizationsModel):
         self.__organizations_ids = data.__list_id__()
 
+    def _store_organizations(self, response_data):
+        """Запомнить id организаций из ответа /api/1/organizations"""
+        if isinstance(response_data, BaseOrganizationsModel):
+            self.__convert_org_data(data=response_data)
+        elif self.return_dict and isinstance(response_data, dict):
+            # список, а не генератор: organizations_ids читают многократно
+            self.__organizations_ids = [org.get('id') for org in response_data.get("organizations", [])]
+
+    @staticmethod
+    def _organizations_payload(organization_ids: List[str] = None, return_additional_info: bool = None,
+                               include_disabled: bool = None) -> dict:
+        data = {}
+        if organization_ids is not None:
+            data["organizationIds"] = organization_ids
+        if return_additional_info is not None:
+            data["returnAdditionalInfo"] = return_additional_info
+        if include_disabled is not None:
+            data["includeDisabled"] = include_disabled
+        return data
+
     def organizations(self, organization_ids: List[str] = None, return_additional_info: bool = None,
                       include_disabled: bool = None, timeout=DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BaseOrganizationsModel]:
@@ -257,13 +629,7 @@ class BaseAPI:
         :return:
         """
         #         https://api-ru.iiko.services/api/1/organizations
-        data = {}
-        if organization_ids is not None:
-            data["organizationIds"] = organization_ids
-        if return_additional_info is not None:
-            data["returnAdditionalInfo"] = return_additional_info
-        if include_disabled is not None:
-            data["includeDisabled"] = include_disabled
+        data = self._organizations_payload(organization_ids, return_additional_info, include_disabled)
         try:
 
             response_data = self._post_request(
@@ -272,10 +638,7 @@ class BaseAPI:
                 model_response_data=BaseOrganizationsModel,
                 timeout=timeout
             )
-            if isinstance(response_data, BaseOrganizationsModel):
-                self.__convert_org_data(data=response_data)
-            if self.return_dict:
-                self.__organizations_ids=(org.get('id') for org in response_data.get("organizations", {}))
+            self._store_organizations(response_data)
             return response_data
 
 
@@ -335,6 +698,7 @@ class Commands(BaseAPI):
 
 
 class Dictionaries(BaseAPI):
+    @cached_response
     def cancel_causes(self, organization_ids: List[str], timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BaseCancelCausesModel]:
         if not bool(organization_ids):
@@ -361,6 +725,7 @@ class Dictionaries(BaseAPI):
                             self.cancel_causes.__name__,
                             f"Не удалось получить причины отмены доставки: \n{err}")
 
+    @cached_response
     def order_types(self, organization_ids: List[str], timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BaseOrderTypesModel]:
         if not bool(organization_ids):
@@ -387,6 +752,7 @@ class Dictionaries(BaseAPI):
                             self.order_types.__name__,
                             f"Не удалось получить типы заказа: \n{err}")
 
+    @cached_response
     def discounts(self, organization_ids: List[str], timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BaseDiscountsModel]:
         if not bool(organization_ids):
@@ -413,6 +779,7 @@ class Dictionaries(BaseAPI):
                             self.discounts.__name__,
                             f"Не удалось получить скидки/надбавки: \n{err}")
 
+    @cached_response
     def payment_types(self, organization_ids: List[str], timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BasePaymentTypesModel]:
         if not bool(organization_ids):
@@ -439,6 +806,7 @@ class Dictionaries(BaseAPI):
                             self.payment_types.__name__,
                             f"Не удалось получить типы оплаты: \n{err}")
 
+    @cached_response
     def removal_types(self, organization_ids: List[str], timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BaseRemovalTypesModel]:
         if not bool(organization_ids):
@@ -465,6 +833,7 @@ class Dictionaries(BaseAPI):
                             self.removal_types.__name__,
                             f"Не удалось получить removal_types: \n{err}")
 
+    @cached_response
     def tips_types(self, timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[CustomErrorModel, BaseTipsTypesModel]:
         try:
 
@@ -561,6 +930,30 @@ class Menu(BaseAPI):
                             self.nomenclature.__name__,
                             f"Не удалось получить номенклатуру: \n{err}")
 
+    def nomenclature_cached(self, organization_id: str, timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
+        CustomErrorModel, BaseNomenclatureModel]:
+        """
+        Номенклатура из nomenclature_cache: полная при первом запросе, далее только изменения с последней ревизии.
+
+        :param organization_id: Organization ID
+        :return: актуальный снимок номенклатуры (dict при return_dict) или ошибка iiko (снимок при этом не меняется)
+        """
+
+        def request(start_revision: Optional[int]):
+            def apply(result):
+                if isinstance(result, CustomErrorModel):
+                    return result
+                snapshot = self.nomenclature_cache.apply(organization_id, result, start_revision=start_revision)
+                if snapshot is None:
+                    # снимок сбросили, пока шёл запрос изменений: без него изменения бесполезны
+                    return request(None)
+                return snapshot.model_dump(mode="json", by_alias=True) if self.return_dict else snapshot
+
+            return self._then(self.nomenclature(organization_id, start_revision=start_revision, timeout=timeout),
+                              apply)
+
+        return request(self.nomenclature_cache.revision(organization_id))
+
     def menu(self, timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[CustomErrorModel, BaseMenuModel]:
         try:
 
@@ -1121,6 +1514,126 @@ class Orders(BaseAPI):
 
 
 class Deliveries(BaseAPI):
+    @staticmethod
+    def _by_delivery_date_and_status_payload(organization_id: List[str], delivery_date_from: Union[datetime, str],
+                                             delivery_date_to: Union[datetime, str] = None, statuses: list = None,
+                                             source_keys: list = None) -> dict:
+        data = {
+            "organizationIds": organization_id,
+        }
+        # datetime форматирует codec по strfdt
+        if isinstance(delivery_date_from, (datetime, str)):
+            data["deliveryDateFrom"] = delivery_date_from
+
+        if delivery_date_to is not None:
+            if isinstance(delivery_date_to, (datetime, str)):
+                data["deliveryDateTo"] = delivery_date_to
+            else:
+                raise TypeError("type delivery_date_to != datetime or str")
+
+        if statuses is not None:
+            if not isinstance(statuses, list):
+                raise TypeError("type statuses != list")
+            data["statuses"] = statuses
+
+        if source_keys is not None:
+            if not isinstance(source_keys, list):
+                raise TypeError("type source_keys != list")
+            data["sourceKeys"] = source_keys
+        return data
+
+    @staticmethod
+    def _by_delivery_date_and_source_key_and_filter_payload(
+            organization_id: List[str],
+            terminal_group_ids: Optional[List[Union[str, uuid.UUID]]] = None,
+            delivery_date_from: Optional[str] = None,
+            delivery_date_to: Optional[str] = None,
+            statuses: Optional[List[str]] = None,
+            has_problem: Optional[bool] = None,
+            order_service_type: Optional[str] = None,
+            search_text: Optional[str] = None,
+            time_to_cooking_error_timeout: Optional[int] = None,
+            cooking_timeout: Optional[int] = None,
+            sort_property: Optional[str] = None,
+            sort_direction: Optional[str] = None,
+            rows_count: Optional[int] = None,
+            source_keys: Optional[List[str]] = None,
+            order_ids: Optional[List[Union[str, uuid.UUID]]] = None) -> dict:
+        data = {
+            "organizationIds": organization_id,
+        }
+
+        if terminal_group_ids is not None:
+            if not isinstance(terminal_group_ids, list):
+                raise TypeError("type terminal_group_ids != list")
+            data["terminalGroupIds"] = terminal_group_ids
+
+        if delivery_date_from is not None:
+            if not isinstance(delivery_date_from, str):
+                raise TypeError("type delivery_date_from != str")
+            data["deliveryDateFrom"] = delivery_date_from
+
+        if delivery_date_to is not None:
+            if not isinstance(delivery_date_to, str):
+                raise TypeError("type delivery_date_to != str")
+            data["deliveryDateTo"] = delivery_date_to
+
+        if statuses is not None:
+            if not isinstance(statuses, list):
+                raise TypeError("type statuses != list")
+            data["statuses"] = statuses
+
+        if has_problem is not None:
+            if not isinstance(has_problem, bool):
+                raise TypeError("type has_problem != list")
+            data["hasProblem"] = has_problem
+
+        if order_service_type is not None:
+            if not isinstance(order_service_type, str):
+                raise TypeError("type order_service_type != str")
+            data["orderServiceType"] = order_service_type
+
+        if search_text is not None:
+            if not isinstance(search_text, str):
+                raise TypeError("type search_text != str")
+            data["searchText"] = search_text
+
+        if time_to_cooking_error_timeout is not None:
+            if not isinstance(time_to_cooking_error_timeout, int):
+                raise TypeError("type time_to_cooking_error_timeout != int")
+            data["timeToCookingErrorTimeout"] = time_to_cooking_error_timeout
+
+        if cooking_timeout is not None:
+            if not isinstance(cooking_timeout, int):
+                raise TypeError("type cooking_timeout != int")
+            data["cookingTimeout"] = cooking_timeout
+
+        if sort_property is not None:
+            if not isinstance(sort_property, str):
+                raise TypeError("type sort_property != str")
+            data["sortProperty"] = sort_property
+
+        if sort_direction is not None:
+            if not isinstance(sort_direction, str):
+                raise TypeError("type sort_direction != str")
+            data["sortDirection"] = sort_direction
+
+        if rows_count is not None:
+            if not isinstance(rows_count, int):
+                raise TypeError("type rows_count != int")
+            data["rowsCount"] = rows_count
+
+        if source_keys is not None:
+            if not isinstance(source_keys, list):
+                raise TypeError("type source_keys != list")
+            data["sourceKeys"] = source_keys
+
+        if order_ids is not None:
+            if not isinstance(order_ids, list):
+                raise TypeError("type order_ids != list")
+            data["orderIds"] = order_ids
+        return data
+
     def delivery_create(self, organization_id: str, order: dict, terminal_group_id: str = None,
                         create_order_settings: Optional[int] = None, timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
         CustomErrorModel, BaseCreatedDeliveryOrderInfoModel]:
@@ -1175,7 +1688,7 @@ class Deliveries(BaseAPI):
             "deliveryStatus": delivery_status,
         }
         if delivery_status == "Delivered":
-            data["deliveryDate"] = delivery_date.strftime(self.strfdt)
+            data["deliveryDate"] = delivery_date
         try:
 
             return self._post_request(
@@ -1280,35 +1793,8 @@ class Deliveries(BaseAPI):
         :return:
         """
         # https://api-ru.iiko.services/api/1/deliveries/by_delivery_date_and_status
-        data = {
-            "organizationIds": organization_id,
-        }
-        if isinstance(delivery_date_from, datetime):
-            data["deliveryDateFrom"] = delivery_date_from.strftime(self.strfdt)
-        elif isinstance(delivery_date_from, str):
-            data["deliveryDateFrom"] = delivery_date_from
-
-        if isinstance(delivery_date_to, datetime):
-            data["deliveryDateTo"] = delivery_date_to.strftime(self.strfdt)
-        elif isinstance(delivery_date_to, str):
-            data["deliveryDateTo"] = delivery_date_to
-        if delivery_date_to is not None:
-            if isinstance(delivery_date_to, datetime):
-                data["deliveryDateTo"] = delivery_date_to.strftime(self.strfdt)
-            elif isinstance(delivery_date_to, str):
-                data["deliveryDateTo"] = delivery_date_to
-            else:
-                raise TypeError("type delivery_date_to != datetime or str")
-
-        if statuses is not None:
-            if not isinstance(statuses, list):
-                raise TypeError("type statuses != list")
-            data["statuses"] = statuses
-
-        if source_keys is not None:
-            if not isinstance(source_keys, list):
-                raise TypeError("type source_keys != list")
-            data["sourceKeys"] = source_keys
+        data = self._by_delivery_date_and_status_payload(organization_id, delivery_date_from, delivery_date_to,
+                                                         statuses, source_keys)
 
         try:
             # result = self.session_s.post(f'{self.base_url}/api/1/deliveries/by_delivery_date_and_status',
@@ -1338,11 +1824,69 @@ class Deliveries(BaseAPI):
                                  self.by_delivery_date_and_status.__name__,
                                  f"Не удалось: \n{err}")
 
-    @experimental("будет дописан в будущем!")
-    def by_revision(self, timeout=BaseAPI.DEFAULT_TIMEOUT):
-        # Retrieve list of orders changed from the time revision was passed.
+    def by_delivery_date_and_status_iter(self,
+                                         organization_id: List[str],
+                                         delivery_date_from: Union[datetime, str],
+                                         delivery_date_to: Union[datetime, str] = None,
+                                         statuses: list = None,
+                                         source_keys: list = None,
+                                         fields: Optional[List[str]] = None,
+                                         timeout=BaseAPI.DEFAULT_TIMEOUT
+                                         ) -> Iterator[Union[ByOrderItemModel, dict]]:
+        """
+        Как by_delivery_date_and_status, но заказы разбираются из ответа по мере чтения и возвращаются по одному.
+        В асинхронном клиенте - async for.
+
+        :param fields: only these ByOrderItemModel fields ("id", "order.status", "order.courier_info.courier.id"), dict per order
+        :return:
+        """
+        data = self._by_delivery_date_and_status_payload(organization_id, delivery_date_from, delivery_date_to,
+                                                         statuses, source_keys)
+        return self._stream_orders("/api/1/deliveries/by_delivery_date_and_status", data, timeout=timeout,
+                                   fields=fields)
+
+    def by_revision(self,
+                    organization_id: List[str],
+                    start_revision: int,
+                    source_keys: Optional[List[str]] = None,
+                    timeout=BaseAPI.DEFAULT_TIMEOUT
+                    ) -> Union[ByRevisionModel, CustomErrorModel]:
+        """
+        Заказы, изменённые после ревизии start_revision.
+
+        :param organization_id: Organization IDs.
+        :param start_revision: Revision from which changes are requested (max_revision of the previous response).
+        :param source_keys: Source keys.
+        :return:
+        """
         # https://api-ru.iiko.services/api/1/deliveries/by_revision
-        pass
+        if not isinstance(start_revision, int):
+            raise TypeError("type start_revision != int")
+        data = {
+            "startRevision": start_revision,
+            "organizationIds": organization_id,
+        }
+        if source_keys is not None:
+            if not isinstance(source_keys, list):
+                raise TypeError("type source_keys != list")
+            data["sourceKeys"] = source_keys
+
+        try:
+            return self._post_request(
+                url="/api/1/deliveries/by_revision",
+                data=data,
+                model_response_data=ByRevisionModel,
+                timeout=timeout
+            )
+
+        except requests.exceptions.RequestException as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 self.by_revision.__name__,
+                                 f"Не удалось получить изменённые заказы: \n{err}")
+        except TypeError as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 self.by_revision.__name__,
+                                 f"Не удалось: \n{err}")
 
     @experimental("будет дописан в будущем!")
     def by_delivery_date_and_phone(self, timeout=BaseAPI.DEFAULT_TIMEOUT):
@@ -1389,79 +1933,10 @@ class Deliveries(BaseAPI):
         """
 
         #         https://api-ru.iiko.services/api/1/deliveries/by_delivery_date_and_source_key_and_filter
-        data = {
-            "organizationIds": organization_id,
-        }
-
-        if terminal_group_ids is not None:
-            if not isinstance(terminal_group_ids, list):
-                raise TypeError("type terminal_group_ids != list")
-            data["terminalGroupIds"] = terminal_group_ids
-
-        if delivery_date_from is not None:
-            if not isinstance(delivery_date_from, str):
-                raise TypeError("type delivery_date_from != str")
-            data["deliveryDateFrom"] = delivery_date_from
-
-        if delivery_date_to is not None:
-            if not isinstance(delivery_date_to, str):
-                raise TypeError("type delivery_date_to != str")
-            data["deliveryDateTo"] = delivery_date_to
-
-        if statuses is not None:
-            if not isinstance(statuses, list):
-                raise TypeError("type statuses != list")
-            data["statuses"] = statuses
-
-        if has_problem is not None:
-            if not isinstance(has_problem, bool):
-                raise TypeError("type has_problem != list")
-            data["hasProblem"] = has_problem
-
-        if order_service_type is not None:
-            if not isinstance(order_service_type, str):
-                raise TypeError("type order_service_type != str")
-            data["orderServiceType"] = order_service_type
-
-        if search_text is not None:
-            if not isinstance(search_text, str):
-                raise TypeError("type search_text != str")
-            data["searchText"] = search_text
-
-        if time_to_cooking_error_timeout is not None:
-            if not isinstance(time_to_cooking_error_timeout, int):
-                raise TypeError("type time_to_cooking_error_timeout != int")
-            data["timeToCookingErrorTimeout"] = time_to_cooking_error_timeout
-
-        if cooking_timeout is not None:
-            if not isinstance(cooking_timeout, int):
-                raise TypeError("type cooking_timeout != int")
-            data["cookingTimeout"] = cooking_timeout
-
-        if sort_property is not None:
-            if not isinstance(sort_property, str):
-                raise TypeError("type sort_property != str")
-            data["sortProperty"] = sort_property
-
-        if sort_direction is not None:
-            if not isinstance(sort_direction, str):
-                raise TypeError("type sort_direction != str")
-            data["sortDirection"] = sort_direction
-
-        if rows_count is not None:
-            if not isinstance(rows_count, int):
-                raise TypeError("type rows_count != int")
-            data["rowsCount"] = rows_count
-
-        if source_keys is not None:
-            if not isinstance(source_keys, list):
-                raise TypeError("type source_keys != list")
-            data["sourceKeys"] = source_keys
-
-        if order_ids is not None:
-            if not isinstance(order_ids, list):
-                raise TypeError("type order_ids != list")
-            data["orderIds"] = order_ids
+        data = self._by_delivery_date_and_source_key_and_filter_payload(
+            organization_id, terminal_group_ids, delivery_date_from, delivery_date_to, statuses, has_problem,
+            order_service_type, search_text, time_to_cooking_error_timeout, cooking_timeout, sort_property,
+            sort_direction, rows_count, source_keys, order_ids)
 
         try:
             return self._post_request(
@@ -1481,6 +1956,25 @@ class Deliveries(BaseAPI):
                                  f"Не удалось: \n{err}")
 
 
+    def by_delivery_date_and_source_key_and_filter_iter(self,
+                                                        organization_id: List[str],
+                                                        fields: Optional[List[str]] = None,
+                                                        timeout=BaseAPI.DEFAULT_TIMEOUT,
+                                                        **filters) -> Iterator[Union[ByOrderItemModel, dict]]:
+        """
+        Как by_delivery_date_and_source_key_and_filter, но заказы разбираются из ответа по мере чтения
+        и возвращаются по одному. В асинхронном клиенте - async for.
+
+        :param organization_id: List
+        :param fields: only these ByOrderItemModel fields ("id", "order.status", "order.courier_info.courier.id"), dict per order
+        :param filters: the same keyword arguments as by_delivery_date_and_source_key_and_filter (statuses, rows_count, ...)
+        :return:
+        """
+        data = self._by_delivery_date_and_source_key_and_filter_payload(organization_id, **filters)
+        return self._stream_orders("/api/1/deliveries/by_delivery_date_and_source_key_and_filter", data,
+                                   timeout=timeout, fields=fields)
+
+
 class Notifications(BaseAPI):
     def send(self, order_source: str, order_id: str, additional_info: str, organization_id: str,
              message_type: str = "delivery_attention", timeout=BaseAPI.DEFAULT_TIMEOUT):
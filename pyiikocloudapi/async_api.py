@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+import time
+import weakref
+from datetime import datetime, timedelta
+from typing import Optional, List, Union, AsyncIterator
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - зависит от окружения
+    httpx = None
+
+from pyiikocloudapi.api import BaseAPI, Orders, Deliveries, Employees, Address, DeliveryRestrictions, TerminalGroup, \
+    Menu, Dictionaries, DiscountPromotion, Commands, Notifications, Customers, WebHook
+from pyiikocloudapi.exception import CheckTimeToken, TokenException, PostException
+from pyiikocloudapi.models import CustomErrorModel, BaseOrganizationsModel, ByOrderItemModel
+from pyiikocloudapi.pool import PoolConfig, async_pool_stats
+from pyiikocloudapi.retry import RetryPolicy
+from pyiikocloudapi.streaming import OrderStreamParser, STREAM_CHUNK_SIZE, resolve_fields
+
+
+class AsyncBaseAPI(BaseAPI):
+    """
+    Асинхронная версия BaseAPI на httpx.AsyncClient.
+
+    Все методы миксинов (Orders, Deliveries, Menu, ...) возвращают корутину, поэтому их нужно вызывать через await.
+    Маркер доступа запрашивается при первом запросе, а не в конструкторе.
+    """
+    def __init__(self, api_login: str, client: Optional["httpx.AsyncClient"] = None, debug: bool = False,
+                 base_url: str = None, working_token: str = None, base_headers: dict = None,
+                 logger: Optional[logging.Logger] = None, return_dict: bool = False,
+                 pool: Optional[PoolConfig] = None, *args, **kwargs):
+        """
+
+        :param api_login: login api iiko cloud
+        :param client: httpx.AsyncClient object
+        :param debug: logging dict response
+        :param base_url: url iiko cloud api
+        :param working_token: Initialize an object based on a working token, that is, without requesting a new one
+        :param base_headers: base header for request in iiko cloud api
+        :param logger: your object Logger
+        :param return_dict: return a dictionary instead of models
+        :param pool: connection pool settings, used when client is not passed
+        """
+        if httpx is None:
+            raise ImportError("Для AsyncIikoTransport необходим httpx: pip install pyiikocloudapi[async]")
+        self.__async_pool = pool
+        if client is not None:
+            self.__client = client
+        else:
+            self.__client = httpx.AsyncClient(transport=pool.async_transport()) if pool is not None else httpx.AsyncClient()
+        self.__token_lock: Optional[asyncio.Lock] = None
+        self.__refresh_handle: Optional[asyncio.TimerHandle] = None
+        self.__refresh_task: Optional[asyncio.Task] = None
+        self.__background_tasks = set()
+        super().__init__(api_login, debug=debug, base_url=base_url, working_token=working_token,
+                         base_headers=base_headers, logger=logger, return_dict=return_dict, **kwargs)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.aclose()
+
+    async def aclose(self):
+        """Закрыть httpx.AsyncClient"""
+        self.stop_token_refresh()
+        await self.__client.aclose()
+
+    @property
+    def client(self) -> "httpx.AsyncClient":
+        return self.__client
+
+    @property
+    def pool(self) -> Optional[PoolConfig]:
+        return self.__async_pool
+
+    def pool_stats(self) -> List[dict]:
+        """Статистика пула соединений httpx (см. pyiikocloudapi.pool.async_pool_stats)"""
+        return async_pool_stats(getattr(self.__client, "_transport", None))
+
+    @property
+    def _token_lock(self) -> asyncio.Lock:
+        # Lock создаётся внутри работающего цикла событий
+        if self.__token_lock is None:
+            self.__token_lock = asyncio.Lock()
+        return self.__token_lock
+
+    def _init_token(self, working_token: Optional[str] = None):
+        # асинхронный клиент всегда работает как lazy_token=True
+        if working_token is not None:
+            self._set_token(working_token)
+
+    def _schedule_token_refresh(self, delay: float):
+        self.stop_token_refresh()
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # вне цикла событий (working_token в конструкторе) обновление начнётся после первого запроса маркера
+            return
+        self_ref = weakref.ref(self)
+
+        def refresh():
+            api = self_ref()
+            if api is not None:
+                api.__refresh_task = loop.create_task(api._background_token_refresh())
+
+        self.__refresh_handle = loop.call_later(delay, refresh)
+
+    async def _background_token_refresh(self):
+        try:
+            await self.__get_access_token(stale_token=self.token)
+        except Exception as err:
+            self.logger.warning(f"Не удалось обновить маркер доступа в фоне: {err}")
+            self._schedule_token_refresh(self.TOKEN_REFRESH_RETRY_INTERVAL)
+
+    def stop_token_refresh(self):
+        """Остановить фоновое обновление маркера доступа"""
+        handle, self.__refresh_handle = self.__refresh_handle, None
+        if handle is not None:
+            handle.cancel()
+
+    def _ready(self, value):
+        async def ready():
+            return value
+
+        return ready()
+
+    def _background(self, call, finish=None):
+        """Выполнить корутину call() фоновой задачей, ошибку записать в лог, в конце вызвать finish()"""
+
+        async def run():
+            try:
+                await call()
+            except Exception as err:
+                self.logger.warning("Фоновый запрос не удался: %s", err)
+            finally:
+                if finish is not None:
+                    finish()
+
+        task = asyncio.get_running_loop().create_task(run())
+        # ссылка на задачу, иначе сборщик мусора может удалить её до завершения
+        self.__background_tasks.add(task)
+        task.add_done_callback(self.__background_tasks.discard)
+
+    def _request_timeout(self, timeout=BaseAPI.DEFAULT_TIMEOUT) -> "httpx.Timeout":
+        connect, read = super()._request_timeout(timeout)
+        return httpx.Timeout(read, connect=connect)
+
+    async def check_status_code_token(self, code: Union[str, int]):
+        if str(code) == "401":
+            await self.__get_access_token(stale_token=self.token)
+
+    async def check_token_time(self) -> bool:
+        """
+        Проверка на время жизни маркера доступа
+        :return: Если прошло 15 мин будет запрошен токен и метод вернёт True, иначе вернётся False
+        """
+        if self.time_token is None:
+            raise CheckTimeToken(
+                self.__class__.__qualname__,
+                self.check_token_time.__name__,
+                f"Не запрошен Token и не присвоен объект типа datetime.datetime")
+        if self.time_token <= datetime.now() - timedelta(minutes=15):
+            await self.__get_access_token(stale_token=self.token)
+            return True
+        return False
+
+    async def access_token(self):
+        """Получить маркер доступа"""
+        try:
+            result = await self.__client.post(f'{self.base_url}/api/1/access_token',
+                                              json={"apiLogin": self.api_login},
+                                              timeout=self._request_timeout())
+            response_data: dict = json.loads(result.content)
+            if response_data.get("errorDescription", None) is not None:
+                raise TypeError(f'{response_data=}')
+
+            if response_data.get("token", None) is not None:
+                self._set_token(response_data.get("token", ""))
+
+        except httpx.HTTPError as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 self.access_token.__name__,
+                                 f"Не удалось получить маркер доступа: \n{err}")
+        except TypeError as err:
+            raise TokenException(self.__class__.__qualname__,
+                                 self.access_token.__name__,
+                                 f"Не удалось получить маркер доступа: \n{err}")
+
+    async def __get_access_token(self, stale_token: Optional[str] = None):
+        # Одновременные корутины ждут один запрос маркера: если пока ждали lock маркер
+        # уже сменился, повторно его не запрашиваем.
+        async with self._token_lock:
+            if self.token is not None and self.token != stale_token:
+                return
+            if self.token_store is None:
+                await self.access_token()
+                return
+            # операции хранилища блокирующие (файлы, сеть), поэтому выполняются в пуле потоков
+            loop = asyncio.get_running_loop()
+            store_lock = self.token_store.lock(self.api_login)
+            await loop.run_in_executor(None, store_lock.__enter__)
+            try:
+                stored = await loop.run_in_executor(None, self.token_store.get, self.api_login)
+                if self._use_stored_token(stored, stale_token):
+                    return
+                await self.access_token()
+                await loop.run_in_executor(None, self._save_stored_token)
+            finally:
+                await loop.run_in_executor(None, store_lock.__exit__, None, None, None)
+
+    async def _post_request(self, url: str, data: dict = None, timeout=BaseAPI.DEFAULT_TIMEOUT,
+                            model_response_data=None, model_error=CustomErrorModel):
+        if data is None:
+            data = {}
+        if self.token is None:
+            await self.__get_access_token()
+        body = self.codec.dumps(data)
+        sampled = self.request_logger.sampled(self.logger)
+        if sampled:
+            self.request_logger.request(self.logger, url, body)
+        started = time.perf_counter()
+        response = await self.__send(url, body, timeout, self.retry_rules.for_url(url))
+        if sampled and self.debug:
+            self.request_logger.response(self.logger, url, response.status_code, response.content,
+                                         time.perf_counter() - started)
+        return self._parse_response(response.status_code, response.content, model_response_data, model_error,
+                                    url=url)
+
+    async def _stream_orders(self, url: str, data: dict, timeout=BaseAPI.DEFAULT_TIMEOUT,
+                             fields: Optional[List[str]] = None) -> AsyncIterator[Union[ByOrderItemModel, dict]]:
+        """Заказы из ответа url по одному, по мере чтения тела (async for)"""
+        resolved = resolve_fields(fields) if fields is not None else None
+        if self.token is None:
+            await self.__get_access_token()
+        body = self.codec.dumps(data)
+        if self.request_logger.sampled(self.logger):
+            self.request_logger.request(self.logger, url, body)
+        response = await self.__send(url, body, timeout, self.retry_rules.for_url(url), stream=True)
+        try:
+            if response.status_code != 200:
+                self._stream_failed(url, response.status_code, await response.aread())
+            parser = OrderStreamParser()
+            async for chunk in response.aiter_bytes(STREAM_CHUNK_SIZE):
+                for raw in parser.feed(chunk):
+                    yield self._stream_item(raw, resolved)
+            self._stream_finished(url, parser)
+        except httpx.TransportError as err:
+            raise PostException(self.__class__.__qualname__, self._stream_orders.__name__,
+                                f"Не удалось дочитать ответ {url}: \n{err}")
+        finally:
+            await response.aclose()
+
+    async def __send(self, url: str, body: bytes, timeout, policy: RetryPolicy,
+                     stream: bool = False) -> "httpx.Response":
+        """
+        Отправить запрос с повторами по policy.
+        После 401 маркер обновляется и запрос повторяется один раз, эта попытка не считается.
+        Каждая попытка, включая повторы, проходит через rate_limiter.
+        При stream=True тело ответа не читается, ответ нужно закрыть (await response.aclose()).
+        """
+        attempt = 1
+        token_refreshed = False
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async(self.api_login, url)
+            used_token = self.token
+            try:
+                request = self.__client.build_request("POST", f'{self.base_url}{url}', content=body,
+                                                      headers=self._request_headers(timeout),
+                                                      timeout=self._request_timeout(timeout))
+                response = await self.__client.send(request, stream=stream)
+            except httpx.TransportError as err:
+                if not policy.retry_error(attempt):
+                    raise PostException(self.__class__.__qualname__,
+                                        self._post_request.__name__,
+                                        f"Не удалось выполнить запрос {url}: \n{err}")
+                delay = policy.delay(attempt)
+                reason = repr(err)
+            else:
+                if response.status_code == 401 and not token_refreshed:
+                    await response.aclose()
+                    await self.__get_access_token(stale_token=used_token)
+                    token_refreshed = True
+                    continue
+                if not policy.retry_status(response.status_code, attempt):
+                    return response
+                await response.aclose()
+                delay = policy.delay(attempt, response.headers.get("Retry-After"))
+                reason = f"status_code={response.status_code}"
+            self.logger.warning("%s: попытка %d не удалась (%s), повтор через %.2f сек.", url, attempt, reason, delay)
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def organizations(self, organization_ids: List[str] = None, return_additional_info: bool = None,
+                            include_disabled: bool = None, timeout=BaseAPI.DEFAULT_TIMEOUT) -> Union[
+        CustomErrorModel, BaseOrganizationsModel]:
+        """
+        Возвращает организации, доступные пользователю API-login.
+        :param organization_ids: Organizations IDs which have to be returned. By default - all organizations from apiLogin.
+        :param return_additional_info: A sign whether additional information about the organization should be returned (RMS version, country, restaurantAddress, etc.), or only minimal information should be returned (id and name).
+        :param include_disabled: Attribute that shows that response contains disabled organizations.
+        :return:
+        """
+        data = self._organizations_payload(organization_ids, return_additional_info, include_disabled)
+        response_data = await self._post_request(
+            url="/api/1/organizations",
+            data=data,
+            model_response_data=BaseOrganizationsModel,
+            timeout=timeout
+        )
+        self._store_organizations(response_data)
+        return response_data
+
+
+class AsyncIikoTransport(AsyncBaseAPI, Orders, Deliveries, Employees, Address, DeliveryRestrictions, TerminalGroup,
+                         Menu, Dictionaries, DiscountPromotion, Commands, Notifications, Customers, WebHook):
+    pass
@@ -0,0 +1,113 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Tuple, Any
+
+from pyiikocloudapi.models import CustomErrorModel
+
+# Методы справочников, которые можно кэшировать
+DICTIONARY_METHODS = ("cancel_causes", "order_types", "discounts", "payment_types", "removal_types", "tips_types")
+
+MISS, FRESH, STALE = "miss", "fresh", "stale"
+
+
+class CachePolicy:
+    """
+    Настройки кэша одного метода.
+
+    :param ttl: сколько секунд ответ считается свежим
+    :param max_entries: сколько разных наборов организаций хранить (вытесняются давно не использованные)
+    :param stale_while_revalidate: сколько секунд после ttl отдавать устаревший ответ, обновляя его в фоне
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 256, stale_while_revalidate: float = 0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_while_revalidate = stale_while_revalidate
+
+
+class ResponseCache:
+    """
+    TTL/LRU кэш ответов справочников (Dictionaries), ключ — метод, клиент (адрес API и api_login)
+    и набор organization_ids без учёта порядка.
+
+    Ошибки iiko не кэшируются. Закэшированные модели общие для всех вызовов, их не следует изменять.
+    Один объект можно передать нескольким клиентам.
+
+    :param default: политика для методов без своей политики
+    :param policies: политики по имени метода, None — не кэшировать метод, например {"discounts": CachePolicy(ttl=60)}
+    """
+
+    def __init__(self, default: Optional[CachePolicy] = None, policies: Optional[Dict[str, Optional[CachePolicy]]] = None):
+        self.default = default if default is not None else CachePolicy()
+        self.policies = dict(policies) if policies is not None else {}
+        self.__entries: Dict[str, OrderedDict] = {}
+        self.__refreshing = set()
+        self.__lock = threading.Lock()
+
+    def policy(self, method: str) -> Optional[CachePolicy]:
+        if method in self.policies:
+            return self.policies[method]
+        return self.default
+
+    def lookup(self, method: str, key: tuple) -> Tuple[str, Any]:
+        """Вернуть (MISS | FRESH | STALE, значение)"""
+        policy = self.policy(method)
+        with self.__lock:
+            entries = self.__entries.get(method)
+            entry = entries.get(key) if entries is not None else None
+            if entry is None or policy is None:
+                return MISS, None
+            value, stored_at = entry
+            age = time.monotonic() - stored_at
+            if age < policy.ttl:
+                entries.move_to_end(key)
+                return FRESH, value
+            if age < policy.ttl + policy.stale_while_revalidate:
+                return STALE, value
+            del entries[key]
+            return MISS, None
+
+    def store(self, method: str, key: tuple, value: Any) -> Any:
+        """Сохранить успешный ответ и вернуть его"""
+        policy = self.policy(method)
+        if policy is None or isinstance(value, CustomErrorModel):
+            return value
+        with self.__lock:
+            entries = self.__entries.setdefault(method, OrderedDict())
+            entries[key] = (value, time.monotonic())
+            entries.move_to_end(key)
+            while len(entries) > policy.max_entries:
+                entries.popitem(last=False)
+        return value
+
+    def begin_refresh(self, method: str, key: tuple) -> bool:
+        """Занять фоновое обновление ключа; False — его уже обновляют"""
+        with self.__lock:
+            if (method, key) in self.__refreshing:
+                return False
+            self.__refreshing.add((method, key))
+            return True
+
+    def end_refresh(self, method: str, key: tuple):
+        with self.__lock:
+            self.__refreshing.discard((method, key))
+
+    def invalidate(self, method: Optional[str] = None, organization_id: Optional[str] = None):
+        """
+        Сбросить кэш: весь, одного метода или ответы, в запросе которых была organization_id.
+
+        :param method: имя метода, например "discounts"
+        :param organization_id: ID организации
+        """
+        with self.__lock:
+            methods = [method] if method is not None else list(self.__entries)
+            for name in methods:
+                entries = self.__entries.get(name)
+                if entries is None:
+                    continue
+                if organization_id is None:
+                    entries.clear()
+                    continue
+                for key in [key for key in entries if organization_id in key[-1]]:
+                    del entries[key]
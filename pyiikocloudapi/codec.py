@@ -0,0 +1,113 @@
+import json
+import re
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from enum import Enum
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - зависит от окружения
+    orjson = None
+
+DEFAULT_DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S.000"
+
+
+def decimal_literal(value: Decimal) -> str:
+    """Decimal как число JSON без потери точности (суммы в заказах и оплатах)"""
+    if not value.is_finite():
+        raise ValueError(f"Decimal {value} нельзя записать в JSON")
+    return str(value)
+
+
+class JsonCodec:
+    """
+    Сериализация тел запросов и разбор ответов на стандартном json.
+
+    datetime пишется в формате iiko (datetime_format), date — как YYYY-MM-DD,
+    Decimal — числом с теми же цифрами (без округления через float), UUID — строкой,
+    поэтому в data можно передавать эти объекты как есть.
+
+    :param datetime_format: формат datetime, по умолчанию как BaseAPI.strfdt
+    """
+    name = "json"
+
+    def __init__(self, datetime_format: str = DEFAULT_DATETIME_FORMAT):
+        self.datetime_format = datetime_format
+
+    def default(self, value: Any) -> Any:
+        """Преобразование типов, которые json не умеет сериализовать сам"""
+        if isinstance(value, datetime):
+            return value.strftime(self.datetime_format)
+        if isinstance(value, date):
+            return value.isoformat()
+        if isinstance(value, uuid.UUID):
+            return str(value)
+        if isinstance(value, Enum):
+            return value.value
+        raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+    def dumps(self, data: Any) -> bytes:
+        return self._with_decimals(
+            lambda default: json.dumps(data, default=default, ensure_ascii=False).encode("utf-8"))
+
+    def _with_decimals(self, dump) -> bytes:
+        """
+        Вызвать dump(default) так, чтобы Decimal попал в результат точным числом: default подставляет
+        вместо него строку-метку со случайным префиксом, после сериализации метка заменяется на цифры.
+        """
+        decimals = []
+        marker = []
+
+        def default(value: Any) -> Any:
+            if isinstance(value, Decimal):
+                if not marker:
+                    marker.append(f"decimal-{uuid.uuid4().hex}-")
+                decimals.append(decimal_literal(value).encode("ascii"))
+                return f"{marker[0]}{len(decimals) - 1}"
+            return self.default(value)
+
+        content = dump(default)
+        if decimals:
+            pattern = re.compile(b'"' + re.escape(marker[0].encode("ascii")) + rb'(\d+)"')
+            content = pattern.sub(lambda match: decimals[int(match.group(1))], content)
+        return content
+
+    def loads(self, content: Union[bytes, str]) -> Any:
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    """Тот же контракт на orjson (pip install pyiikocloudapi[orjson])"""
+    name = "orjson"
+
+    def __init__(self, datetime_format: str = DEFAULT_DATETIME_FORMAT):
+        if orjson is None:
+            raise ImportError("Для OrjsonCodec нужен пакет orjson: pip install pyiikocloudapi[orjson]")
+        super().__init__(datetime_format)
+
+    def default(self, value: Any) -> Any:
+        # orjson >= 3.9 вставляет Fragment как есть, метки для Decimal не нужны
+        if isinstance(value, Decimal) and hasattr(orjson, "Fragment"):
+            return orjson.Fragment(decimal_literal(value))
+        return super().default(value)
+
+    # OPT_PASSTHROUGH_DATETIME отдаёт datetime и date в default, иначе orjson пишет их в ISO 8601;
+    # OPT_NON_STR_KEYS принимает ключи int, float, bool и None, как стандартный json
+    OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson is not None else 0
+
+    def dumps(self, data: Any) -> bytes:
+        if hasattr(orjson, "Fragment"):
+            return orjson.dumps(data, default=self.default, option=self.OPTIONS)
+        return self._with_decimals(lambda default: orjson.dumps(data, default=default, option=self.OPTIONS))
+
+    def loads(self, content: Union[bytes, str]) -> Any:
+        return orjson.loads(content)
+
+
+def get_default_codec(datetime_format: str = DEFAULT_DATETIME_FORMAT) -> JsonCodec:
+    """orjson, если установлен, иначе стандартный json"""
+    if orjson is not None:
+        return OrjsonCodec(datetime_format)
+    return JsonCodec(datetime_format)
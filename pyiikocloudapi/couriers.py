@@ -0,0 +1,109 @@
+import threading
+from typing import Optional, Dict, List, Set, Union
+
+from pyiikocloudapi.models import CouriersModel, EmployeeItemModel, CustomErrorModel
+
+
+class CourierRegistry:
+    """
+    Курьеры из ответов couriers с индексами по id, коду, организации и признаку удаления.
+
+    update() заменяет курьеров только тех организаций, что пришли в ответе, остальные не трогает,
+    поэтому реестр можно обновлять запросами по части организаций. Поиск без совпадения возвращает None.
+    """
+
+    def __init__(self, couriers: Optional[CouriersModel] = None):
+        self.__by_id: Dict[str, EmployeeItemModel] = {}
+        # все курьеры с кодом в порядке появления: по коду отдаётся первый, как в CouriersModel
+        self.__code_owners: Dict[str, Dict[str, EmployeeItemModel]] = {}
+        self.__by_organization: Dict[str, Dict[str, EmployeeItemModel]] = {}
+        self.__organizations_of: Dict[str, Set[str]] = {}
+        self.__active: Dict[str, EmployeeItemModel] = {}
+        self.__deleted: Dict[str, EmployeeItemModel] = {}
+        self.__lock = threading.Lock()
+        if couriers is not None:
+            self.update(couriers)
+
+    def __len__(self):
+        return len(self.__by_id)
+
+    def update(self, couriers: Union[CouriersModel, dict]) -> "CourierRegistry":
+        """Наложить ответ couriers (модель или dict при return_dict)"""
+        if isinstance(couriers, dict):
+            couriers = CouriersModel.model_validate(couriers)
+        with self.__lock:
+            for employees in couriers.employees:
+                items = {item.id: item for item in employees.items or []}
+                previous = self.__by_organization.get(employees.organization_id, {})
+                for courier_id in previous.keys() - items.keys():
+                    self.__detach(courier_id, employees.organization_id)
+                self.__by_organization[employees.organization_id] = items
+                for item in items.values():
+                    self.__attach(item, employees.organization_id)
+        return self
+
+    def __attach(self, item: EmployeeItemModel, organization_id: str):
+        old = self.__by_id.get(item.id)
+        if old is not None and old.code != item.code:
+            self.__release_code(old)
+        self.__by_id[item.id] = item
+        self.__code_owners.setdefault(item.code, {})[item.id] = item
+        self.__organizations_of.setdefault(item.id, set()).add(organization_id)
+        if item.is_deleted:
+            self.__active.pop(item.id, None)
+            self.__deleted[item.id] = item
+        else:
+            self.__deleted.pop(item.id, None)
+            self.__active[item.id] = item
+
+    def __detach(self, courier_id: str, organization_id: str):
+        organizations = self.__organizations_of.get(courier_id)
+        if organizations is not None:
+            organizations.discard(organization_id)
+            if organizations:
+                return
+            del self.__organizations_of[courier_id]
+        item = self.__by_id.pop(courier_id, None)
+        if item is not None:
+            self.__release_code(item)
+        self.__active.pop(courier_id, None)
+        self.__deleted.pop(courier_id, None)
+
+    def __release_code(self, item: EmployeeItemModel):
+        owners = self.__code_owners.get(item.code)
+        if owners is not None and owners.pop(item.id, None) is not None and not owners:
+            del self.__code_owners[item.code]
+
+    def refresh(self, api, organization_ids: List[str]):
+        """
+        Запросить couriers для organization_ids и обновить реестр.
+        Возвращает реестр или ошибку iiko; в асинхронном клиенте — корутину.
+        """
+
+        def apply(response):
+            if isinstance(response, CustomErrorModel):
+                return response
+            return self.update(response)
+
+        return api._then(api.couriers(organization_ids), apply)
+
+    def get_by_id(self, courier_id: str) -> Optional[EmployeeItemModel]:
+        return self.__by_id.get(courier_id)
+
+    def get_by_code(self, code: str) -> Optional[EmployeeItemModel]:
+        with self.__lock:
+            owners = self.__code_owners.get(code)
+            return next(iter(owners.values())) if owners else None
+
+    def in_organization(self, organization_id: str, include_deleted: bool = False) -> List[EmployeeItemModel]:
+        items = self.__by_organization.get(organization_id, {}).values()
+        return [item for item in items if include_deleted or not item.is_deleted]
+
+    def organizations_of(self, courier_id: str) -> List[str]:
+        return list(self.__organizations_of.get(courier_id, ()))
+
+    def active(self) -> List[EmployeeItemModel]:
+        return list(self.__active.values())
+
+    def deleted(self) -> List[EmployeeItemModel]:
+        return list(self.__deleted.values())
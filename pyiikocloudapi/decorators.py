@@ -2,6 +2,8 @@ import functools
 import inspect
 import warnings
 
+from pyiikocloudapi.cache import MISS, STALE
+
 string_types = (type(b''), type(u''))
 
 
@@ -105,3 +107,32 @@ def experimental(reason):
 
     else:
         raise TypeError(repr(type(reason)))
+
+
+def cached_response(func):
+    """
+    Кэширование ответа метода клиента в self.response_cache (см. pyiikocloudapi.cache.ResponseCache).
+    Ключ — адрес API, api_login клиента, return_dict и набор organization_ids без учёта порядка,
+    поэтому кэш можно делить между клиентами с разными логинами; работает и в асинхронном клиенте.
+    """
+    name = func.__name__
+    signature = inspect.signature(func)
+
+    @functools.wraps(func)
+    def wrapper(self, *args, **kwargs):
+        cache = self.response_cache
+        if cache is None or cache.policy(name) is None:
+            return func(self, *args, **kwargs)
+        organization_ids = signature.bind(self, *args, **kwargs).arguments.get("organization_ids") or ()
+        # организации всегда последний элемент ключа, по ним работает ResponseCache.invalidate
+        key = (self.base_url, self.api_login, self.return_dict, tuple(sorted(set(organization_ids))))
+        status, value = cache.lookup(name, key)
+        if status == MISS:
+            return self._then(func(self, *args, **kwargs), lambda result: cache.store(name, key, result))
+        if status == STALE and cache.begin_refresh(name, key):
+            self._background(lambda: self._then(func(self, *args, **kwargs),
+                                                lambda result: cache.store(name, key, result)),
+                             lambda: cache.end_refresh(name, key))
+        return self._ready(value)
+
+    return wrapper
@@ -0,0 +1,94 @@
+import logging
+import random
+from typing import Union, Optional, NamedTuple
+
+
+class Preview:
+    """Начало тела запроса или ответа для лога; строка собирается только если запись действительно пишется"""
+    __slots__ = ("content", "limit")
+
+    def __init__(self, content: Union[bytes, str, None], limit: int):
+        self.content = content
+        self.limit = limit
+
+    def __str__(self) -> str:
+        content = self.content
+        if content is None:
+            return ""
+        size = len(content)
+        head = content[:self.limit]
+        if isinstance(head, bytes):
+            head = head.decode("utf-8", errors="replace")
+        if size > self.limit:
+            return f"{head}... (+{size - self.limit} байт)"
+        return head
+
+
+class RequestLogger:
+    """
+    Логирование запросов к iiko Cloud API.
+
+    Запрос пишется на уровне INFO, ответ — на DEBUG и только при debug=True у клиента.
+    Сообщения форматируются лениво: если уровень выключен, тело не читается и строка не строится.
+    В extra передаются поля iiko_url, iiko_status, iiko_elapsed_ms, iiko_request_size, iiko_response_size
+    для структурированных обработчиков (json-логгеры, Sentry и т.п.).
+
+    :param preview_limit: сколько байт тела показывать в сообщении (0 - не показывать)
+    :param sample_rate: доля запросов, попадающих в лог, от 0 до 1
+    """
+
+    def __init__(self, preview_limit: int = 1024, sample_rate: float = 1.0):
+        self.preview_limit = preview_limit
+        self.sample_rate = sample_rate
+
+    def sampled(self, logger: logging.Logger) -> bool:
+        """Писать ли в лог этот запрос; решается один раз для запроса и его ответа"""
+        if not logger.isEnabledFor(logging.INFO) and not logger.isEnabledFor(logging.DEBUG):
+            return False
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def request(self, logger: logging.Logger, url: str, body: bytes):
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        logger.info("iiko запрос %s, %d байт: %s", url, len(body), Preview(body, self.preview_limit),
+                    extra={"iiko_url": url, "iiko_request_size": len(body)})
+
+    def response(self, logger: logging.Logger, url: str, status_code: int, content: bytes, elapsed: float):
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        elapsed_ms = round(elapsed * 1000, 1)
+        logger.debug("iiko ответ %s, status_code=%s, %d байт за %s мс: %s", url, status_code, len(content),
+                     elapsed_ms, Preview(content, self.preview_limit),
+                     extra={"iiko_url": url, "iiko_status": status_code, "iiko_elapsed_ms": elapsed_ms,
+                            "iiko_response_size": len(content)})
+
+
+class RetainedResponse(NamedTuple):
+    url: Optional[str]
+    status_code: int
+    content: bytes
+
+
+class ResponseRetention:
+    """
+    Что клиент держит в памяти из последних ответов.
+
+    По умолчанию хранится сырое тело последнего ответа (last_data декодирует его при обращении).
+    Для долгоживущих воркеров хранение можно выключить или ограничить размером,
+    для отладки — держать кольцевой буфер последних сырых ответов (response_history).
+
+    :param enabled: хранить last_data
+    :param max_bytes: не хранить в last_data ответы больше этого размера, байт (None - без ограничения)
+    :param history: сколько последних ответов держать в response_history (0 - не держать)
+    """
+
+    def __init__(self, enabled: bool = True, max_bytes: Optional[int] = None, history: int = 0):
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.history = history
+
+    def keep_last(self, content: bytes) -> bool:
+        return self.enabled and (self.max_bytes is None or len(content) <= self.max_bytes)
+
+
+RETENTION_OFF = ResponseRetention(enabled=False)
@@ -2,7 +2,7 @@ from decimal import Decimal
 from enum import Enum
 from typing import Optional, List, Union, Any
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, Field, field_validator, PrivateAttr
 
 
 class IdNameModel(BaseModel):
@@ -153,12 +153,28 @@ class EmployeeIsOpenModel(ErrorModel):
 
 class CouriersModel(BaseResponseModel):
     employees: List[EmployeesModel]
-
-    def get_by_employee_code(self, employee_code: str):
-        return next(x for i in self.employees for x in i.items if x.code == employee_code)
-
-    def get_by_employee_id(self, employee_id: str):
-        return next(x for i in self.employees for x in i.items if x.id == employee_id)
+    _by_code: Optional[dict] = PrivateAttr(None)
+    _by_id: Optional[dict] = PrivateAttr(None)
+
+    def _build_index(self):
+        # индексы строятся один раз при первом поиске, при совпадении берётся первый курьер, как раньше
+        self._by_code, self._by_id = {}, {}
+        for employees in self.employees:
+            for item in employees.items or []:
+                self._by_code.setdefault(item.code, item)
+                self._by_id.setdefault(item.id, item)
+
+    def get_by_employee_code(self, employee_code: str) -> Optional[EmployeeItemModel]:
+        """Курьер по коду или None"""
+        if self._by_code is None:
+            self._build_index()
+        return self._by_code.get(employee_code)
+
+    def get_by_employee_id(self, employee_id: str) -> Optional[EmployeeItemModel]:
+        """Курьер по id или None"""
+        if self._by_id is None:
+            self._build_index()
+        return self._by_id.get(employee_id)
 
 
 class CustomerModel(BaseModel):
@@ -403,13 +419,30 @@ class OrdersByOrganizationsModel(BaseModel):
     organization_id: str = Field(alias='organizationId')
     orders: Optional[List[ByOrderItemModel]] = None
 
-    def get_by_courier_name(self, courier_name: str):
-        return next(i for i in self.orders if
-                    i.order.courier_info is not None and str(i.order.courier_info.courier.name) == courier_name)
-
-    def get_by_courier_id(self, courier_id: str):
-        return next(i for i in self.orders if
-                    i.order.courier_info is not None and i.order.courier_info.courier.id == courier_id)
+    _by_courier_name: Optional[dict] = PrivateAttr(None)
+    _by_courier_id: Optional[dict] = PrivateAttr(None)
+
+    def _build_index(self):
+        # индексы строятся один раз при первом поиске, при совпадении берётся первый заказ, как раньше
+        self._by_courier_name, self._by_courier_id = {}, {}
+        for item in self.orders or []:
+            if item.order is None or item.order.courier_info is None:
+                continue
+            courier = item.order.courier_info.courier
+            self._by_courier_name.setdefault(str(courier.name), item)
+            self._by_courier_id.setdefault(courier.id, item)
+
+    def get_by_courier_name(self, courier_name: str) -> Optional[ByOrderItemModel]:
+        """Первый заказ курьера по имени или None"""
+        if self._by_courier_name is None:
+            self._build_index()
+        return self._by_courier_name.get(courier_name)
+
+    def get_by_courier_id(self, courier_id: str) -> Optional[ByOrderItemModel]:
+        """Первый заказ курьера по id или None"""
+        if self._by_courier_id is None:
+            self._build_index()
+        return self._by_courier_id.get(courier_id)
 
     # def get_by_courier_id_v2(self, courier_id: str):
     #     for i in self.orders:
@@ -427,6 +460,10 @@ class ByDeliveryDateAndSourceKeyAndFilter(ByDeliveryDateAndStatusModel):
     pass
 
 
+class ByRevisionModel(ByDeliveryDateAndStatusModel):
+    pass
+
+
 class RegionsItemModel(BaseModel):
     id: str
     name: str
@@ -768,8 +805,8 @@ class NPGroupModifierModel(BaseModel):
 class NProductModel(BaseModel):
     fat_amount: Optional[float] = Field(None, alias="fatAmount")
     proteins_amount: Optional[float] = Field(None, alias="proteinsAmount")
-    carbohydrates_amount: Optional[float] = Field(None, alias="energyAmount")
-    energy_amount: Optional[float] = Field(None, alias="carbohydratesAmount")
+    carbohydrates_amount: Optional[float] = Field(None, alias="carbohydratesAmount")
+    energy_amount: Optional[float] = Field(None, alias="energyAmount")
     fat_full_amount: Optional[float] = Field(None, alias="fatFullAmount")
     proteins_full_amount: Optional[float] = Field(None, alias="proteinsFullAmount")
     carbohydrates_full_amount: Optional[float] = Field(None, alias="carbohydratesFullAmount")
@@ -0,0 +1,383 @@
+import threading
+from typing import Optional, Dict, List, Union, Tuple, NamedTuple
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - зависит от окружения
+    numpy = None
+
+from pyiikocloudapi.models import BaseNomenclatureModel, NProductModel, NomenclatureGroupModel, \
+    NProductCategoriesModel, NSizeModel, NPGroupModifierModel, NPSPPriceModel
+
+
+def _merge_by_id(items: list, changed: list) -> list:
+    """Заменить элементы с теми же id и добавить новые в конец, порядок остальных сохраняется"""
+    if not changed:
+        return items
+    merged = {item.id: item for item in items}
+    for item in changed:
+        merged[item.id] = item
+    return list(merged.values())
+
+
+def merge_nomenclature(snapshot: BaseNomenclatureModel, delta: BaseNomenclatureModel) -> BaseNomenclatureModel:
+    """
+    Наложить ответ nomenclature с startRevision на полный снимок.
+
+    В дельте iiko присылает только изменённые группы, категории, товары и размеры (удалённые — с isDeleted),
+    они заменяют элементы снимка с тем же id.
+    """
+    return BaseNomenclatureModel.model_construct(
+        correlation_id=delta.correlation_id,
+        groups=_merge_by_id(snapshot.groups, delta.groups),
+        product_categories=_merge_by_id(snapshot.product_categories, delta.product_categories),
+        products=_merge_by_id(snapshot.products, delta.products),
+        sizes=_merge_by_id(snapshot.sizes, delta.sizes),
+        revision=delta.revision,
+    )
+
+
+class NomenclatureCache:
+    """
+    Снимки номенклатуры по организациям с последней ревизией.
+
+    Первый запрос организации скачивает полную номенклатуру, следующие — только изменения
+    с сохранённой ревизии (startRevision), которые накладываются на снимок.
+    Один объект можно передать нескольким клиентам.
+    """
+
+    def __init__(self):
+        self.__snapshots: Dict[str, BaseNomenclatureModel] = {}
+        self.__indexes: Dict[str, "NomenclatureIndex"] = {}
+        self.__lock = threading.Lock()
+
+    def get(self, organization_id: str) -> Optional[BaseNomenclatureModel]:
+        return self.__snapshots.get(organization_id)
+
+    def revision(self, organization_id: str) -> Optional[int]:
+        snapshot = self.__snapshots.get(organization_id)
+        return snapshot.revision if snapshot is not None else None
+
+    def organizations(self) -> List[str]:
+        return list(self.__snapshots)
+
+    def apply(self, organization_id: str, response: Union[BaseNomenclatureModel, dict],
+              start_revision: Optional[int] = None) -> Optional[BaseNomenclatureModel]:
+        """
+        Обновить снимок организации ответом nomenclature и вернуть актуальный снимок.
+
+        Если ответ с изменениями (start_revision задан), а снимка нет или он старше start_revision
+        (его сбросили invalidate() или заменили, пока шёл запрос), ответ отбрасывается и возвращается None:
+        изменения без полного снимка нельзя хранить, нужно запросить номенклатуру полностью.
+
+        :param organization_id: ID организации
+        :param response: ответ nomenclature (модель или dict при return_dict)
+        :param start_revision: startRevision запроса, None - ответ содержит полную номенклатуру
+        """
+        if isinstance(response, dict):
+            response = BaseNomenclatureModel.model_validate(response)
+        with self.__lock:
+            snapshot = self.__snapshots.get(organization_id)
+            if start_revision is not None and (snapshot is None or snapshot.revision < start_revision):
+                return None
+            if start_revision is None:
+                self.__snapshots[organization_id] = response
+                self.__indexes.pop(organization_id, None)
+            elif response.revision >= snapshot.revision:
+                self.__snapshots[organization_id] = merge_nomenclature(snapshot, response)
+                index = self.__indexes.get(organization_id)
+                if index is not None:
+                    index.update(response)
+            return self.__snapshots[organization_id]
+
+    def put(self, organization_id: str, snapshot: BaseNomenclatureModel):
+        """Положить готовый полный снимок (например, загруженный с диска)"""
+        with self.__lock:
+            self.__snapshots[organization_id] = snapshot
+            self.__indexes.pop(organization_id, None)
+
+    def index(self, organization_id: str) -> Optional["NomenclatureIndex"]:
+        """Индекс снимка организации; строится при первом обращении и дальше обновляется вместе со снимком"""
+        with self.__lock:
+            index = self.__indexes.get(organization_id)
+            if index is None:
+                snapshot = self.__snapshots.get(organization_id)
+                if snapshot is None:
+                    return None
+                index = self.__indexes[organization_id] = NomenclatureIndex(snapshot)
+            return index
+
+    def invalidate(self, organization_id: Optional[str] = None):
+        """Забыть снимок организации (или все), следующий запрос скачает номенклатуру полностью"""
+        with self.__lock:
+            if organization_id is None:
+                self.__snapshots.clear()
+                self.__indexes.clear()
+            else:
+                self.__snapshots.pop(organization_id, None)
+                self.__indexes.pop(organization_id, None)
+
+
+class NomenclatureIndex:
+    """
+    Индексы по снимку номенклатуры для поиска за O(1).
+
+    - товары по id, артикулу (code) и группе (group_id);
+    - группы по id и дерево групп по parentGroup;
+    - групповой модификатор товара по id дочернего модификатора;
+    - цена по (id товара, id размера).
+
+    update(delta) переиндексирует только изменённые элементы.
+    """
+
+    def __init__(self, nomenclature: BaseNomenclatureModel):
+        self.revision = nomenclature.revision
+        self.products: Dict[str, NProductModel] = {}
+        self.products_by_code: Dict[str, NProductModel] = {}
+        # все неудалённые товары с артикулом: при удалении одного из товаров с общим артикулом остаётся другой
+        self.__code_owners: Dict[str, Dict[str, NProductModel]] = {}
+        self.__products_by_group: Dict[Optional[str], Dict[str, NProductModel]] = {}
+        self.groups: Dict[str, NomenclatureGroupModel] = {}
+        self.__children: Dict[Optional[str], Dict[str, NomenclatureGroupModel]] = {}
+        self.categories: Dict[str, NProductCategoriesModel] = {}
+        self.sizes: Dict[str, NSizeModel] = {}
+        self.group_modifiers: Dict[Tuple[str, str], NPGroupModifierModel] = {}
+        self.prices: Dict[Tuple[str, Optional[str]], NPSPPriceModel] = {}
+        self.update(nomenclature)
+
+    def update(self, delta: BaseNomenclatureModel):
+        """Наложить изменения (ответ с startRevision или полный снимок)"""
+        for group in delta.groups:
+            self.__remove_group(group.id)
+            self.groups[group.id] = group
+            self.__children.setdefault(group.parent_group, {})[group.id] = group
+        for category in delta.product_categories:
+            self.categories[category.id] = category
+        for size in delta.sizes:
+            self.sizes[size.id] = size
+        for product in delta.products:
+            self.__remove_product(product.id)
+            self.__add_product(product)
+        self.revision = delta.revision
+
+    def __remove_group(self, group_id: str):
+        old = self.groups.pop(group_id, None)
+        if old is not None:
+            self.__children.get(old.parent_group, {}).pop(group_id, None)
+
+    def __add_product(self, product: NProductModel):
+        self.products[product.id] = product
+        if product.code and not product.is_deleted:
+            self.__code_owners.setdefault(product.code, {})[product.id] = product
+            self.products_by_code.setdefault(product.code, product)
+        self.__products_by_group.setdefault(product.group_id, {})[product.id] = product
+        for group_modifier in product.group_modifiers:
+            if group_modifier is None:
+                continue
+            for modifier in group_modifier.child_modifiers:
+                self.group_modifiers[(product.id, modifier.id)] = group_modifier
+        for size_price in product.size_prices:
+            self.prices[(product.id, size_price.size_id)] = size_price.price
+
+    def __remove_product(self, product_id: str):
+        old = self.products.pop(product_id, None)
+        if old is None:
+            return
+        owners = self.__code_owners.get(old.code) if old.code else None
+        if owners is not None and owners.pop(product_id, None) is not None:
+            if not owners:
+                del self.__code_owners[old.code]
+            if self.products_by_code.get(old.code) is old:
+                if owners:
+                    self.products_by_code[old.code] = next(iter(owners.values()))
+                else:
+                    del self.products_by_code[old.code]
+        self.__products_by_group.get(old.group_id, {}).pop(product_id, None)
+        for group_modifier in old.group_modifiers:
+            if group_modifier is None:
+                continue
+            for modifier in group_modifier.child_modifiers:
+                self.group_modifiers.pop((product_id, modifier.id), None)
+        for size_price in old.size_prices:
+            self.prices.pop((product_id, size_price.size_id), None)
+
+    def product(self, product_id: str) -> Optional[NProductModel]:
+        return self.products.get(product_id)
+
+    def product_by_code(self, code: str) -> Optional[NProductModel]:
+        return self.products_by_code.get(code)
+
+    def products_in_group(self, group_id: Optional[str]) -> List[NProductModel]:
+        return list(self.__products_by_group.get(group_id, {}).values())
+
+    def child_groups(self, group_id: Optional[str] = None) -> List[NomenclatureGroupModel]:
+        """Дочерние группы, для group_id=None — корневые"""
+        return list(self.__children.get(group_id, {}).values())
+
+    def group_path(self, group_id: str) -> List[NomenclatureGroupModel]:
+        """Цепочка групп от корня до group_id"""
+        path = []
+        group = self.groups.get(group_id)
+        while group is not None and len(path) <= len(self.groups):
+            path.append(group)
+            group = self.groups.get(group.parent_group) if group.parent_group else None
+        path.reverse()
+        return path
+
+    def group_modifier(self, product_id: str, modifier_id: str) -> Optional[NPGroupModifierModel]:
+        """Групповой модификатор товара, в который входит modifier_id"""
+        return self.group_modifiers.get((product_id, modifier_id))
+
+    def price(self, product_id: str, size_id: Optional[str] = None) -> Optional[NPSPPriceModel]:
+        return self.prices.get((product_id, size_id))
+
+
+# Колонки nomenclature_columns: строка — пара (товар, размер)
+PRICE_COLUMNS = ("product_id", "code", "group_id", "parent_group", "product_category_id", "size_id",
+                 "current_price", "next_price", "is_included_in_menu", "is_deleted")
+NUTRITION_COLUMNS = ("weight", "fat_amount", "proteins_amount", "carbohydrates_amount", "energy_amount",
+                     "fat_full_amount", "proteins_full_amount", "carbohydrates_full_amount", "energy_full_amount")
+_FLOAT_COLUMNS = frozenset({"current_price", "next_price"} | set(NUTRITION_COLUMNS))
+_BOOL_COLUMNS = frozenset({"is_included_in_menu", "is_deleted"})
+
+
+def nomenclature_columns(nomenclature: BaseNomenclatureModel) -> Dict[str, list]:
+    """
+    Номенклатура в колонках: по строке на каждую цену размера товара (товар без цен — одна строка с None).
+
+    Колонки — PRICE_COLUMNS и NUTRITION_COLUMNS, значения в одном порядке во всех колонках.
+    Для векторных вычислений см. columns_to_numpy.
+    """
+    columns = {name: [] for name in PRICE_COLUMNS + NUTRITION_COLUMNS}
+    add = {name: values.append for name, values in columns.items()}
+    for product in nomenclature.products:
+        for size_price in product.size_prices or (None,):
+            add["product_id"](product.id)
+            add["code"](product.code)
+            add["group_id"](product.group_id)
+            add["parent_group"](product.parent_group)
+            add["product_category_id"](product.product_category_id)
+            add["is_deleted"](bool(product.is_deleted))
+            price = size_price.price if size_price is not None else None
+            add["size_id"](size_price.size_id if size_price is not None else None)
+            add["current_price"](price.current_price if price is not None else None)
+            add["next_price"](price.next_price if price is not None else None)
+            add["is_included_in_menu"](price.is_included_in_menu if price is not None else False)
+            for name in NUTRITION_COLUMNS:
+                add[name](getattr(product, name))
+    return columns
+
+
+def columns_to_numpy(columns: Dict[str, list]) -> Dict[str, "numpy.ndarray"]:
+    """
+    Колонки nomenclature_columns в массивы numpy (pip install pyiikocloudapi[numpy]):
+    цены и пищевая ценность — float64 с nan вместо None, флаги — bool, идентификаторы — object.
+    """
+    if numpy is None:
+        raise ImportError("Для columns_to_numpy нужен пакет numpy: pip install pyiikocloudapi[numpy]")
+    arrays = {}
+    for name, values in columns.items():
+        if name in _FLOAT_COLUMNS:
+            arrays[name] = numpy.array([numpy.nan if value is None else value for value in values],
+                                       dtype=numpy.float64)
+        elif name in _BOOL_COLUMNS:
+            arrays[name] = numpy.array(values, dtype=bool)
+        else:
+            arrays[name] = numpy.array(values, dtype=object)
+    return arrays
+
+
+class PriceChange(NamedTuple):
+    product_id: str
+    size_id: Optional[str]
+    old: Optional[NPSPPriceModel]
+    new: Optional[NPSPPriceModel]
+
+
+class NomenclatureDiff:
+    """Изменения номенклатуры между двумя ревизиями"""
+
+    def __init__(self, old_revision: Optional[int], new_revision: int):
+        self.old_revision = old_revision
+        self.new_revision = new_revision
+        self.added_products: List[NProductModel] = []
+        self.removed_products: List[NProductModel] = []
+        self.changed_products: List[NProductModel] = []
+        self.modifiers_changed: List[NProductModel] = []
+        self.price_changes: List[PriceChange] = []
+        self.added_groups: List[NomenclatureGroupModel] = []
+        self.removed_groups: List[NomenclatureGroupModel] = []
+        self.changed_groups: List[NomenclatureGroupModel] = []
+
+    def is_empty(self) -> bool:
+        return not (self.added_products or self.removed_products or self.changed_products or self.price_changes
+                    or self.added_groups or self.removed_groups or self.changed_groups)
+
+    def __str__(self):
+        return (f"{self.old_revision} -> {self.new_revision}: товары +{len(self.added_products)} "
+                f"-{len(self.removed_products)} ~{len(self.changed_products)}, цены ~{len(self.price_changes)}, "
+                f"группы +{len(self.added_groups)} -{len(self.removed_groups)} ~{len(self.changed_groups)}")
+
+
+def _by_id(source: Union[BaseNomenclatureModel, NomenclatureIndex], name: str) -> dict:
+    if isinstance(source, NomenclatureIndex):
+        return getattr(source, name)
+    return {item.id: item for item in getattr(source, name)}
+
+
+def _size_prices(product: NProductModel) -> Dict[Optional[str], NPSPPriceModel]:
+    return {size_price.size_id: size_price.price for size_price in product.size_prices}
+
+
+def _diff_items(old: dict, new_items: list, added: list, removed: list, changed: list):
+    for item in new_items:
+        previous = old.get(item.id)
+        if previous is None or previous.is_deleted:
+            # восстановленный элемент тоже новый: сравнивать его с удалённой версией нечего
+            if not item.is_deleted:
+                added.append(item)
+        elif item.is_deleted:
+            removed.append(item)
+        elif item != previous:
+            changed.append(item)
+
+
+def diff_nomenclature(old: Union[BaseNomenclatureModel, NomenclatureIndex], new: BaseNomenclatureModel,
+                      delta: bool = False) -> NomenclatureDiff:
+    """
+    Сравнить номенклатуру за один проход по id.
+
+    :param old: прежний снимок или его NomenclatureIndex
+    :param new: новый полный снимок или, при delta=True, ответ nomenclature с startRevision
+    :param delta: new содержит только изменения, отсутствие элемента в нём не означает удаления
+    """
+    diff = NomenclatureDiff(old.revision, new.revision)
+    old_products = _by_id(old, "products")
+    old_groups = _by_id(old, "groups")
+
+    _diff_items(old_groups, new.groups, diff.added_groups, diff.removed_groups, diff.changed_groups)
+    _diff_items(old_products, new.products, diff.added_products, diff.removed_products, diff.changed_products)
+
+    for product in diff.added_products:
+        diff.price_changes.extend(PriceChange(product.id, size_id, None, price)
+                                  for size_id, price in _size_prices(product).items())
+    for product in diff.changed_products:
+        previous = old_products[product.id]
+        if product.modifiers != previous.modifiers or product.group_modifiers != previous.group_modifiers:
+            diff.modifiers_changed.append(product)
+        old_prices, new_prices = _size_prices(previous), _size_prices(product)
+        for size_id, price in new_prices.items():
+            if old_prices.get(size_id) != price:
+                diff.price_changes.append(PriceChange(product.id, size_id, old_prices.get(size_id), price))
+        for size_id, price in old_prices.items():
+            if size_id not in new_prices:
+                diff.price_changes.append(PriceChange(product.id, size_id, price, None))
+
+    if not delta:
+        new_product_ids = {product.id for product in new.products}
+        diff.removed_products.extend(product for product_id, product in old_products.items()
+                                     if product_id not in new_product_ids and not product.is_deleted)
+        new_group_ids = {group.id for group in new.groups}
+        diff.removed_groups.extend(group for group_id, group in old_groups.items()
+                                   if group_id not in new_group_ids and not group.is_deleted)
+    return diff
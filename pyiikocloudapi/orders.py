@@ -0,0 +1,378 @@
+import asyncio
+import inspect
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Dict, List, Iterable, Union, Hashable, NamedTuple
+
+from pyiikocloudapi.exception import CloudException
+from pyiikocloudapi.models import ByDeliveryDateAndStatusModel, ByOrderItemModel, ByRevisionModel, CustomErrorModel, \
+    OrdersByOrganizationsModel
+
+_NOT_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """Телефон для поиска: только цифры"""
+    if not phone:
+        return None
+    return _NOT_DIGITS.sub("", phone) or None
+
+
+def iter_orders(source: Union[ByDeliveryDateAndStatusModel, dict, Iterable[ByOrderItemModel], None]) \
+        -> Iterable[ByOrderItemModel]:
+    """Заказы из ответа списка доставок (модель или dict при return_dict) или из готового списка"""
+    if source is None:
+        return
+    if isinstance(source, dict):
+        source = ByDeliveryDateAndStatusModel.model_validate(source)
+    if isinstance(source, ByDeliveryDateAndStatusModel):
+        for organization in source.orders_by_organizations or []:
+            yield from organization.orders or []
+        return
+    yield from source
+
+
+class OrderIndex:
+    """
+    Индексы по заказам доставки: по id, курьеру, статусу, группе терминалов, организации,
+    телефону клиента, внешнему номеру и sourceKey.
+
+    Строится один раз по ответу by_delivery_date_and_status (или нескольким), update() добавляет
+    и заменяет заказы по id с переиндексацией только их.
+    """
+
+    def __init__(self, source: Union[ByDeliveryDateAndStatusModel, dict, Iterable[ByOrderItemModel], None] = None):
+        self.__orders: Dict[str, ByOrderItemModel] = {}
+        self.__by_external_number: Dict[str, ByOrderItemModel] = {}
+        self.__indexes: Dict[str, Dict[Hashable, Dict[str, ByOrderItemModel]]] = {
+            "courier": {}, "status": {}, "terminal_group": {}, "organization": {}, "phone": {}, "source_key": {},
+        }
+        self.__lock = threading.Lock()
+        self.update(source)
+
+    def __len__(self):
+        return len(self.__orders)
+
+    def __iter__(self):
+        return iter(list(self.__orders.values()))
+
+    @staticmethod
+    def __keys(item: ByOrderItemModel) -> Dict[str, Optional[Hashable]]:
+        order = item.order
+        courier_info = order.courier_info if order is not None else None
+        return {
+            "courier": courier_info.courier.id if courier_info is not None and courier_info.courier is not None
+            else None,
+            "status": order.status if order is not None else None,
+            "terminal_group": order.terminal_group_id if order is not None else None,
+            "organization": item.organization_id,
+            "phone": normalize_phone(order.phone) if order is not None else None,
+            "source_key": order.source_key if order is not None else None,
+        }
+
+    def update(self, source: Union[ByDeliveryDateAndStatusModel, dict, Iterable[ByOrderItemModel], None]):
+        """Добавить или заменить заказы по id"""
+        with self.__lock:
+            for item in iter_orders(source):
+                self.__remove(item.id)
+                self.__add(item)
+
+    def remove(self, order_id: str) -> Optional[ByOrderItemModel]:
+        with self.__lock:
+            return self.__remove(order_id)
+
+    def __add(self, item: ByOrderItemModel):
+        self.__orders[item.id] = item
+        if item.external_number:
+            self.__by_external_number[item.external_number] = item
+        for name, key in self.__keys(item).items():
+            if key is not None:
+                self.__indexes[name].setdefault(key, {})[item.id] = item
+
+    def __remove(self, order_id: str) -> Optional[ByOrderItemModel]:
+        item = self.__orders.pop(order_id, None)
+        if item is None:
+            return None
+        if item.external_number and self.__by_external_number.get(item.external_number) is item:
+            del self.__by_external_number[item.external_number]
+        for name, key in self.__keys(item).items():
+            bucket = self.__indexes[name].get(key)
+            if bucket is not None:
+                bucket.pop(order_id, None)
+                if not bucket:
+                    del self.__indexes[name][key]
+        return item
+
+    def __find(self, name: str, key: Hashable) -> List[ByOrderItemModel]:
+        return list(self.__indexes[name].get(key, {}).values())
+
+    def get(self, order_id: str) -> Optional[ByOrderItemModel]:
+        return self.__orders.get(order_id)
+
+    def by_external_number(self, external_number: str) -> Optional[ByOrderItemModel]:
+        return self.__by_external_number.get(external_number)
+
+    def by_courier(self, courier_id: str) -> List[ByOrderItemModel]:
+        return self.__find("courier", courier_id)
+
+    def by_status(self, status: str) -> List[ByOrderItemModel]:
+        return self.__find("status", status)
+
+    def by_terminal_group(self, terminal_group_id: str) -> List[ByOrderItemModel]:
+        return self.__find("terminal_group", terminal_group_id)
+
+    def by_organization(self, organization_id: str) -> List[ByOrderItemModel]:
+        return self.__find("organization", organization_id)
+
+    def by_phone(self, phone: str) -> List[ByOrderItemModel]:
+        return self.__find("phone", normalize_phone(phone))
+
+    def by_source_key(self, source_key: str) -> List[ByOrderItemModel]:
+        return self.__find("source_key", source_key)
+
+    def statuses(self) -> Dict[str, int]:
+        """Количество заказов по статусам"""
+        return {status: len(bucket) for status, bucket in self.__indexes["status"].items()}
+
+
+async def _settled(awaitable):
+    """Результат корутины запроса или её исключение CloudException вместо выброса"""
+    try:
+        return await awaitable
+    except CloudException as err:
+        return err
+
+
+class OrderChangeFeed:
+    """
+    Лента изменений заказов доставки на основе by_revision.
+
+    Помнит ревизию каждой организации и при poll() запрашивает только заказы, изменённые после неё;
+    изменения накладываются на состояние (OrderIndex), poll() возвращает только изменённые заказы.
+    Организации с одинаковой ревизией запрашиваются одним запросом. В асинхронном клиенте poll() - корутина.
+    Ошибки iiko и исключения запроса (TokenException, PostException) по группам организаций не прерывают
+    poll(): их ревизии не сдвигаются, а ошибки последнего poll() доступны в errors.
+
+    Начальное состояние удобно заполнить полным списком за день через seed(), тогда max_revision
+    этого ответа становится ревизией его организаций.
+
+    :param api: IikoTransport или AsyncIikoTransport
+    :param organization_ids: организации ленты
+    :param start_revision: ревизия, с которой запрашивать изменения до первого seed()/poll()
+    :param source_keys: sourceKeys для by_revision
+    :param index: готовое состояние, по умолчанию пустой OrderIndex
+    :param timeout: таймаут запросов by_revision, по умолчанию DEFAULT_TIMEOUT клиента
+    """
+
+    def __init__(self, api, organization_ids: List[str], start_revision: int = 0,
+                 source_keys: Optional[List[str]] = None, index: Optional[OrderIndex] = None, timeout=None):
+        self.__api = api
+        self.__revisions: Dict[str, int] = {organization_id: start_revision for organization_id in organization_ids}
+        self.__source_keys = source_keys
+        self.__index = index if index is not None else OrderIndex()
+        self.__timeout = timeout if timeout is not None else api.DEFAULT_TIMEOUT
+        self.__errors: List[Union[CustomErrorModel, CloudException]] = []
+        self.__lock = threading.Lock()
+        self.logger: logging.Logger = api.logger
+
+    @property
+    def index(self) -> OrderIndex:
+        """Текущее состояние заказов"""
+        return self.__index
+
+    @property
+    def revisions(self) -> Dict[str, int]:
+        with self.__lock:
+            return dict(self.__revisions)
+
+    @property
+    def errors(self) -> List[Union[CustomErrorModel, CloudException]]:
+        """Ошибки iiko и исключения запросов последнего poll(), пусто - все организации обновлены"""
+        return list(self.__errors)
+
+    def revision(self, organization_id: str) -> Optional[int]:
+        with self.__lock:
+            return self.__revisions.get(organization_id)
+
+    def seed(self, response: Union[ByDeliveryDateAndStatusModel, dict, CustomErrorModel],
+             organization_ids: Optional[List[str]] = None) -> Union[List[ByOrderItemModel], CustomErrorModel]:
+        """
+        Наложить полный список заказов (by_delivery_date_and_status) и запомнить его max_revision
+        как ревизию organization_ids - организаций, по которым был запрос.
+        По умолчанию это организации из ordersByOrganizations ответа; если в запросе были организации
+        без заказов, передайте organization_ids явно.
+        """
+        if isinstance(response, CustomErrorModel):
+            return response
+        if isinstance(response, dict):
+            response = ByDeliveryDateAndStatusModel.model_validate(response)
+        if organization_ids is None:
+            organization_ids = [organization.organization_id for organization in response.orders_by_organizations or []]
+        return self.__apply(response, organization_ids)
+
+    def __apply(self, response, organization_ids: List[str]) -> Union[List[ByOrderItemModel], CustomErrorModel]:
+        if isinstance(response, CustomErrorModel):
+            return response
+        if isinstance(response, dict):
+            response = ByRevisionModel.model_validate(response)
+        changed = list(iter_orders(response))
+        self.__index.update(changed)
+        with self.__lock:
+            for organization_id in organization_ids:
+                # ревизия не уменьшается, если ответ пришёл позже более свежего
+                if response.max_revision > self.__revisions.get(organization_id, -1):
+                    self.__revisions[organization_id] = response.max_revision
+        return changed
+
+    def poll(self) -> List[ByOrderItemModel]:
+        """
+        Запросить изменения всех организаций ленты и вернуть изменённые заказы.
+        Группы организаций, по которым iiko вернула ошибку или запрос не удался, пропускаются: их ревизии не сдвигаются,
+        ошибки записываются в errors, изменения остальных групп возвращаются как обычно.
+        """
+        with self.__lock:
+            groups: Dict[int, List[str]] = {}
+            for organization_id, revision in self.__revisions.items():
+                groups.setdefault(revision, []).append(organization_id)
+        pending = sorted(groups.items())
+        changed: List[ByOrderItemModel] = []
+        errors: List[Union[CustomErrorModel, CloudException]] = []
+        self.__errors = errors
+        if not pending:
+            return self.__api._ready(changed)
+
+        def request():
+            revision, organization_ids = pending.pop(0)
+
+            def applied(response):
+                if isinstance(response, CloudException):
+                    self.logger.warning("Не удалось получить изменения заказов %s: %s", organization_ids, response)
+                    errors.append(response)
+                    return request() if pending else changed
+                result = self.__apply(response, organization_ids)
+                if isinstance(result, CustomErrorModel):
+                    self.logger.warning("Не удалось получить изменения заказов %s: %s", organization_ids,
+                                        result.error_description)
+                    errors.append(result)
+                else:
+                    changed.extend(result)
+                return request() if pending else changed
+
+            try:
+                response = self.__api.by_revision(organization_ids, revision, source_keys=self.__source_keys,
+                                                  timeout=self.__timeout)
+            except CloudException as err:
+                response = err
+            if inspect.isawaitable(response):
+                response = _settled(response)
+            return self.__api._then(response, applied)
+
+        return request()
+
+
+class DeliveryShard(NamedTuple):
+    organization_ids: List[str]
+    delivery_date_from: datetime
+    delivery_date_to: datetime
+
+
+def plan_delivery_shards(organization_ids: List[str], delivery_date_from: datetime, delivery_date_to: datetime,
+                         time_slice: timedelta = timedelta(days=1),
+                         organizations_per_shard: int = 5) -> List[DeliveryShard]:
+    """Разбить период и список организаций на части: отрезки по time_slice × группы по organizations_per_shard"""
+    if not isinstance(delivery_date_from, datetime) or not isinstance(delivery_date_to, datetime):
+        raise TypeError("type delivery_date_from/delivery_date_to != datetime")
+    if time_slice <= timedelta(0):
+        raise ValueError("time_slice должен быть больше нуля")
+    if organizations_per_shard < 1:
+        raise ValueError("organizations_per_shard должен быть больше нуля")
+    windows = []
+    start = delivery_date_from
+    while start < delivery_date_to:
+        end = min(start + time_slice, delivery_date_to)
+        windows.append((start, end))
+        start = end
+    if not windows:
+        windows.append((delivery_date_from, delivery_date_to))
+    chunks = [organization_ids[i:i + organizations_per_shard]
+              for i in range(0, len(organization_ids), organizations_per_shard)]
+    return [DeliveryShard(chunk, start, end) for chunk in chunks for start, end in windows]
+
+
+def merge_delivery_results(responses: Iterable[Union[ByDeliveryDateAndStatusModel, dict]]) \
+        -> ByDeliveryDateAndStatusModel:
+    """
+    Объединить ответы by_delivery_date_and_status: заказы без повторов по id (из двух копий остаётся
+    более свежая по timestamp), max_revision - наибольший из ответов.
+    """
+    max_revision = 0
+    correlation_id = None
+    organizations: Dict[str, Dict[str, ByOrderItemModel]] = {}
+    for response in responses:
+        if isinstance(response, dict):
+            response = ByDeliveryDateAndStatusModel.model_validate(response)
+        max_revision = max(max_revision, response.max_revision)
+        correlation_id = correlation_id or response.correlation_id
+        for organization in response.orders_by_organizations or []:
+            orders = organizations.setdefault(organization.organization_id, {})
+            for item in organization.orders or []:
+                known = orders.get(item.id)
+                if known is None or item.timestamp >= known.timestamp:
+                    orders[item.id] = item
+    return ByDeliveryDateAndStatusModel.model_construct(
+        correlation_id=correlation_id,
+        max_revision=max_revision,
+        orders_by_organizations=[OrdersByOrganizationsModel.model_construct(organization_id=organization_id,
+                                                                            orders=list(orders.values()))
+                                 for organization_id, orders in organizations.items()],
+    )
+
+
+def by_delivery_date_and_status_sharded(api, organization_ids: List[str], delivery_date_from: datetime,
+                                        delivery_date_to: datetime, statuses: list = None,
+                                        source_keys: list = None, time_slice: timedelta = timedelta(days=1),
+                                        organizations_per_shard: int = 5, max_concurrency: int = 4,
+                                        timeout=None) -> Union[ByDeliveryDateAndStatusModel, CustomErrorModel]:
+    """
+    by_delivery_date_and_status для большого периода и многих организаций: запрос разбивается на части
+    (plan_delivery_shards), части выполняются параллельно, не больше max_concurrency одновременно
+    (в IikoTransport - потоки, в AsyncIikoTransport - корутины, результат нужно дождаться через await),
+    ответы объединяются merge_delivery_results.
+
+    Возвращает объединённую модель (dict при return_dict) или первую ошибку iiko.
+    """
+    shards = plan_delivery_shards(organization_ids, delivery_date_from, delivery_date_to,
+                                  time_slice=time_slice, organizations_per_shard=organizations_per_shard)
+    timeout = timeout if timeout is not None else api.DEFAULT_TIMEOUT
+
+    def fetch(shard: DeliveryShard):
+        return api.by_delivery_date_and_status(shard.organization_ids, shard.delivery_date_from,
+                                               shard.delivery_date_to, statuses=statuses,
+                                               source_keys=source_keys, timeout=timeout)
+
+    def merged(responses):
+        for response in responses:
+            if isinstance(response, CustomErrorModel):
+                return response
+        result = merge_delivery_results(responses)
+        return result.model_dump(mode="json", by_alias=True) if api.return_dict else result
+
+    if inspect.iscoroutinefunction(api._post_request):
+        async def run():
+            semaphore = asyncio.Semaphore(max_concurrency)
+
+            async def fetch_async(shard: DeliveryShard):
+                async with semaphore:
+                    return await fetch(shard)
+
+            return merged(await asyncio.gather(*(fetch_async(shard) for shard in shards)))
+
+        return run()
+
+    if len(shards) == 1 or max_concurrency <= 1:
+        return merged([fetch(shard) for shard in shards])
+    with ThreadPoolExecutor(max_workers=min(max_concurrency, len(shards))) as pool:
+        return merged(list(pool.map(fetch, shards)))
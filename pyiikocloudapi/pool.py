@@ -0,0 +1,114 @@
+import socket
+from typing import Optional, List
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # pragma: no cover - зависит от окружения
+    httpx = None
+
+
+class PoolConfig:
+    """
+    Настройки пула соединений с iiko Cloud API.
+
+    :param pool_connections: сколько пулов (хостов) держать открытыми
+    :param pool_maxsize: максимум соединений с одним хостом
+    :param pool_block: ждать свободного соединения, а не открывать лишнее сверх pool_maxsize
+    :param max_connections: общий лимит соединений асинхронного клиента, по умолчанию pool_connections * pool_maxsize
+    :param keepalive_expiry: сколько секунд держать простаивающее соединение (только асинхронный клиент)
+    :param tcp_keepalive: включить TCP keep-alive, чтобы простаивающие соединения не обрывались по дороге
+    :param http2: использовать HTTP/2 (только асинхронный клиент, нужен пакет h2: pip install pyiikocloudapi[http2])
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, pool_block: bool = False,
+                 max_connections: Optional[int] = None, keepalive_expiry: Optional[float] = 5.0,
+                 tcp_keepalive: bool = False, http2: bool = False):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.max_connections = max_connections if max_connections is not None else pool_connections * pool_maxsize
+        self.keepalive_expiry = keepalive_expiry
+        self.tcp_keepalive = tcp_keepalive
+        self.http2 = http2
+
+    def socket_options(self) -> Optional[List[tuple]]:
+        if not self.tcp_keepalive:
+            return None
+        options = [(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1), (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, 60))
+        if hasattr(socket, "TCP_KEEPINTVL"):
+            options.append((socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, 30))
+        return options
+
+    def mount(self, session: requests.Session) -> "PoolAdapter":
+        """Подключить пул к requests.Session для http:// и https://"""
+        adapter = PoolAdapter(pool_connections=self.pool_connections, pool_maxsize=self.pool_maxsize,
+                              pool_block=self.pool_block, socket_options=self.socket_options())
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return adapter
+
+    def async_transport(self) -> "httpx.AsyncHTTPTransport":
+        """Транспорт httpx с этими настройками для AsyncIikoTransport"""
+        limits = httpx.Limits(max_connections=self.max_connections,
+                              max_keepalive_connections=self.pool_maxsize,
+                              keepalive_expiry=self.keepalive_expiry)
+        kwargs = {}
+        if self.socket_options() is not None:
+            kwargs["socket_options"] = self.socket_options()
+        return httpx.AsyncHTTPTransport(limits=limits, http2=self.http2, **kwargs)
+
+
+class PoolAdapter(HTTPAdapter):
+    """HTTPAdapter с настраиваемыми опциями сокета"""
+    __attrs__ = HTTPAdapter.__attrs__ + ["_PoolAdapter__socket_options"]
+
+    def __init__(self, socket_options: Optional[List[tuple]] = None, *args, **kwargs):
+        self.__socket_options = socket_options
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self.__socket_options is not None:
+            kwargs["socket_options"] = self.__socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+
+def pool_stats(adapter: HTTPAdapter) -> List[dict]:
+    """Состояние пулов requests по хостам: размер, простаивающие соединения, сколько создано соединений и запросов"""
+    out = []
+    pools = adapter.poolmanager.pools
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        out.append({
+            "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+            "maxsize": pool.pool.maxsize if pool.pool is not None else 0,
+            "idle": sum(1 for conn in list(pool.pool.queue) if conn is not None) if pool.pool is not None else 0,
+            "num_connections": pool.num_connections,
+            "num_requests": pool.num_requests,
+        })
+    return out
+
+
+def async_pool_stats(transport) -> List[dict]:
+    """Состояние пула httpx по хостам: всего, простаивающих, занятых и HTTP/2 соединений"""
+    pool = getattr(transport, "_pool", None)
+    if pool is None:
+        return []
+    by_origin = {}
+    for conn in pool.connections:
+        origin = str(getattr(conn, "_origin", "unknown"))
+        item = by_origin.setdefault(origin, {"host": origin, "connections": 0, "idle": 0, "active": 0, "http2": 0})
+        item["connections"] += 1
+        if conn.is_idle():
+            item["idle"] += 1
+        elif not conn.is_closed():
+            item["active"] += 1
+        if "HTTP/2" in conn.info():
+            item["http2"] += 1
+    return list(by_origin.values())
@@ -0,0 +1,146 @@
+import asyncio
+import threading
+import time
+from typing import Optional, Dict, Tuple
+
+# Группы ограничений iiko Transport по url, названия как в разделах документации api-ru.iiko.services
+ENDPOINT_GROUPS = {
+    "/api/1/organizations": "Organizations",
+    "/api/1/terminal_groups": "Terminal groups",
+    "/api/1/terminal_groups/is_alive": "Terminal groups",
+    "/api/1/cancel_causes": "Dictionaries",
+    "/api/1/deliveries/order_types": "Dictionaries",
+    "/api/1/discounts": "Dictionaries",
+    "/api/1/payment_types": "Dictionaries",
+    "/api/1/removal_types": "Dictionaries",
+    "/api/1/tips_types": "Dictionaries",
+    "/api/1/nomenclature": "Menu",
+    "/api/2/menu": "Menu",
+    "/api/2/menu/by_id": "Menu",
+    "/api/1/stop_lists": "Menu",
+    "/api/1/stop_lists/check": "Menu",
+    "/api/1/combo": "Menu",
+    "/api/1/combo/calculate": "Menu",
+    "/api/1/commands/status": "Operations",
+    "/api/1/deliveries/create": "Deliveries: Create and update",
+    "/api/1/deliveries/update_order_delivery_status": "Deliveries: Create and update",
+    "/api/1/deliveries/confirm": "Deliveries: Create and update",
+    "/api/1/deliveries/cancel_confirmation": "Deliveries: Create and update",
+    "/api/1/deliveries/by_delivery_date_and_status": "Deliveries: Retrieve",
+    "/api/1/deliveries/by_revision": "Deliveries: Retrieve",
+    "/api/1/deliveries/by_delivery_date_and_source_key_and_filter": "Deliveries: Retrieve",
+    "/api/1/regions": "Addresses",
+    "/api/1/cities": "Addresses",
+    "/api/1/streets/by_city": "Addresses",
+    "/api/1/delivery_restrictions": "Delivery restrictions",
+    "/api/1/delivery_restrictions/allowed": "Delivery restrictions",
+    "/api/1/employees/couriers": "Employees",
+    "/api/1/employees/info": "Employees",
+    "/api/1/employees/shift/clockin": "Employees: shifts",
+    "/api/1/employees/shift/clockout": "Employees: shifts",
+    "/api/1/employees/shift/is_open": "Employees: shifts",
+    "/api/1/employees/shift/by_courier": "Employees: shifts",
+    "/api/1/order/create": "Orders",
+    "/api/1/order/by_id": "Orders",
+    "/api/1/order/by_table": "Orders",
+    "/api/1/notifications/send": "Notifications",
+    "/api/1/loyalty/iiko/coupons/series": "Discounts and promotions",
+    "/api/1/loyalty/iiko/coupons/info": "Discounts and promotions",
+    "/api/1/loyalty/iiko/customer/info": "Customers",
+    "/api/1/loyalty/iiko/customer/create_or_update": "Customers",
+    "/api/1/loyalty/iiko/customer/program/add": "Customers",
+    "/api/1/loyalty/iiko/customer/card/add": "Customers",
+    "/api/1/loyalty/iiko/customer/card/remove": "Customers",
+    "/api/1/loyalty/iiko/customer/wallet/hold": "Customers",
+    "/api/1/loyalty/iiko/customer/wallet/cancel_hold": "Customers",
+    "/api/1/loyalty/iiko/customer/wallet/topup": "Customers",
+    "/api/1/loyalty/iiko/customer/wallet/chargeoff": "Customers",
+}
+
+
+class RateLimit:
+    """
+    Лимит группы: не больше requests запросов за per_seconds секунд, всплеск до burst запросов подряд.
+
+    :param requests: запросов за период
+    :param per_seconds: длина периода, сек.
+    :param burst: размер "ведра", по умолчанию равен requests
+    """
+
+    def __init__(self, requests: float, per_seconds: float = 1.0, burst: Optional[float] = None):
+        self.rate = requests / per_seconds
+        self.burst = burst if burst is not None else requests
+
+
+class TokenBucket:
+    """Потокобезопасный token bucket с резервированием: запрос сразу занимает маркер и узнаёт, сколько ему ждать"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.__rate = rate
+        self.__capacity = capacity
+        self.__tokens = capacity
+        self.__updated = time.monotonic()
+        self.__lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Занять маркер и вернуть задержку в секундах перед запросом (0 - можно сразу)"""
+        with self.__lock:
+            now = time.monotonic()
+            self.__tokens = min(self.__capacity, self.__tokens + (now - self.__updated) * self.__rate)
+            self.__updated = now
+            self.__tokens -= 1
+            if self.__tokens >= 0:
+                return 0.0
+            # маркер "в долг": ждём, пока он накопится, очередь запросов выстраивается равномерно
+            return -self.__tokens / self.__rate
+
+
+class RateLimiter:
+    """
+    Ограничитель запросов по группам ограничений iiko Transport, отдельно для каждого api_login.
+
+    Один объект можно передать нескольким клиентам (в том числе из разных потоков и AsyncIikoTransport),
+    тогда лимит будет общим. Запрос сверх лимита не падает с 429, а ждёт своей очереди.
+
+    :param limits: лимиты по названию группы, например {"Employees: shifts": RateLimit(2, per_seconds=1)}
+    :param default: лимит для групп без своего лимита (None - без ограничения)
+    :param endpoint_groups: соответствие url и группы, по умолчанию ENDPOINT_GROUPS
+    """
+
+    def __init__(self, limits: Optional[Dict[str, RateLimit]] = None, default: Optional[RateLimit] = None,
+                 endpoint_groups: Optional[Dict[str, str]] = None):
+        self.limits = dict(limits) if limits is not None else {}
+        self.default = default
+        self.endpoint_groups = dict(endpoint_groups) if endpoint_groups is not None else dict(ENDPOINT_GROUPS)
+        self.__buckets: Dict[Tuple[str, str], TokenBucket] = {}
+        self.__lock = threading.Lock()
+
+    def group_for(self, url: str) -> str:
+        return self.endpoint_groups.get(url, url)
+
+    def reserve(self, api_login: str, url: str) -> float:
+        """Занять место в лимите группы url и вернуть задержку перед запросом, сек."""
+        group = self.group_for(url)
+        limit = self.limits.get(group, self.default)
+        if limit is None:
+            return 0.0
+        key = (api_login, group)
+        bucket = self.__buckets.get(key)
+        if bucket is None:
+            with self.__lock:
+                bucket = self.__buckets.setdefault(key, TokenBucket(limit.rate, limit.burst))
+        return bucket.reserve()
+
+    def acquire(self, api_login: str, url: str) -> float:
+        """Дождаться разрешения на запрос (блокирует поток), возвращает время ожидания"""
+        delay = self.reserve(api_login, url)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def acquire_async(self, api_login: str, url: str) -> float:
+        """Дождаться разрешения на запрос без блокировки цикла событий"""
+        delay = self.reserve(api_login, url)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
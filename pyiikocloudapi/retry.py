@@ -0,0 +1,113 @@
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Iterable
+
+# Методы, меняющие данные в iiko: повтор может, например, создать заказ или списать бонусы дважды
+WRITE_ENDPOINTS = frozenset({
+    "/api/1/order/create",
+    "/api/1/deliveries/create",
+    "/api/1/deliveries/update_order_delivery_status",
+    "/api/1/deliveries/confirm",
+    "/api/1/deliveries/cancel_confirmation",
+    "/api/1/notifications/send",
+    "/api/1/employees/shift/clockin",
+    "/api/1/employees/shift/clockout",
+    "/api/1/loyalty/iiko/customer/create_or_update",
+    "/api/1/loyalty/iiko/customer/program/add",
+    "/api/1/loyalty/iiko/customer/card/add",
+    "/api/1/loyalty/iiko/customer/card/remove",
+    "/api/1/loyalty/iiko/customer/wallet/hold",
+    "/api/1/loyalty/iiko/customer/wallet/cancel_hold",
+    "/api/1/loyalty/iiko/customer/wallet/topup",
+    "/api/1/loyalty/iiko/customer/wallet/chargeoff",
+})
+
+
+class RetryPolicy:
+    """
+    Политика повторов запроса: ограниченное число попыток с экспоненциальной задержкой и jitter.
+
+    :param max_attempts: всего попыток, включая первую (1 - без повторов)
+    :param backoff_factor: задержка перед первым повтором, далее удваивается, сек.
+    :param max_backoff: верхняя граница задержки, сек.
+    :param jitter: случайная задержка в [0, backoff] ("full jitter"), чтобы клиенты не повторяли запросы разом
+    :param retry_statuses: коды ответа, после которых запрос повторяется
+    :param retry_on_connection_errors: повторять при обрыве соединения и таймауте
+    :param respect_retry_after: ждать столько, сколько указано в заголовке Retry-After
+    :param max_retry_after: не ждать по Retry-After дольше этого, сек.
+    """
+
+    def __init__(self, max_attempts: int = 3, backoff_factor: float = 0.5, max_backoff: float = 10.0,
+                 jitter: bool = True, retry_statuses: Iterable[int] = (408, 429, 500, 502, 503, 504),
+                 retry_on_connection_errors: bool = True, respect_retry_after: bool = True,
+                 max_retry_after: float = 60.0):
+        self.max_attempts = max_attempts
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.retry_statuses = frozenset(retry_statuses)
+        self.retry_on_connection_errors = retry_on_connection_errors
+        self.respect_retry_after = respect_retry_after
+        self.max_retry_after = max_retry_after
+
+    def retry_status(self, status_code: int, attempt: int) -> bool:
+        """Нужен ли повтор после ответа status_code на попытке attempt (с 1)"""
+        return attempt < self.max_attempts and status_code in self.retry_statuses
+
+    def retry_error(self, attempt: int) -> bool:
+        """Нужен ли повтор после ошибки соединения на попытке attempt (с 1)"""
+        return attempt < self.max_attempts and self.retry_on_connection_errors
+
+    def delay(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Сколько ждать перед попыткой attempt + 1"""
+        if self.respect_retry_after and retry_after:
+            seconds = parse_retry_after(retry_after)
+            if seconds is not None:
+                return min(seconds, self.max_retry_after)
+        backoff = min(self.max_backoff, self.backoff_factor * (2 ** (attempt - 1)))
+        return random.uniform(0, backoff) if self.jitter else backoff
+
+
+NO_RETRY = RetryPolicy(max_attempts=1)
+
+
+def parse_retry_after(value: str) -> Optional[float]:
+    """Retry-After в секундах: число секунд или HTTP-дата"""
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+class RetryRules:
+    """
+    Выбор политики повторов по url метода.
+
+    :param default: политика для читающих (идемпотентных) методов
+    :param write: политика для методов из write_endpoints, по умолчанию без повторов
+    :param endpoints: политики для отдельных url, например {"/api/1/nomenclature": RetryPolicy(max_attempts=5)}
+    :param write_endpoints: url, которые нельзя повторять вслепую
+    """
+
+    def __init__(self, default: Optional[RetryPolicy] = None, write: RetryPolicy = NO_RETRY,
+                 endpoints: Optional[Dict[str, RetryPolicy]] = None,
+                 write_endpoints: Iterable[str] = WRITE_ENDPOINTS):
+        self.default = default if default is not None else RetryPolicy()
+        self.write = write
+        self.endpoints = dict(endpoints) if endpoints is not None else {}
+        self.write_endpoints = frozenset(write_endpoints)
+
+    def for_url(self, url: str) -> RetryPolicy:
+        policy = self.endpoints.get(url)
+        if policy is not None:
+            return policy
+        return self.write if url in self.write_endpoints else self.default
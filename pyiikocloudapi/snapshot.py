@@ -0,0 +1,177 @@
+import hashlib
+import hmac
+import mmap
+import os
+import pickle
+import secrets
+import tempfile
+import time
+from typing import Optional, List, Any
+from urllib.parse import quote, unquote
+
+from pyiikocloudapi.nomenclature import NomenclatureCache
+from pyiikocloudapi.token_store import private_directory, user_cache_directory
+
+# меняется при несовместимом изменении формата файла
+SNAPSHOT_FORMAT = 2
+# файл: MAGIC, HMAC-SHA256 от pickle ключом хранилища, pickle
+_MAGIC = b"IIKOSNAP" + bytes([SNAPSHOT_FORMAT])
+_DIGEST_SIZE = hashlib.sha256().digest_size
+_KEY_FILE = ".snapshot-key"
+NOMENCLATURE = "BaseNomenclatureModel"
+MENU_BY_ID = "BaseMenuByIdModel"
+
+
+class SnapshotStore:
+    """
+    Снимки разобранных моделей (номенклатура, внешнее меню) на диске по организации и ревизии.
+
+    Модель сохраняется pickle (протокол 5) и читается через mmap, без повторного разбора json и валидации.
+    Файлы пишутся атомарно, для каждой организации хранится keep последних ревизий.
+
+    pickle выполняет код при загрузке, поэтому чужие файлы не разбираются: каталог должен принадлежать
+    текущему пользователю с правами 700 (иначе PermissionError), а каждый файл подписан HMAC-SHA256;
+    файл без верной подписи считается отсутствующим.
+
+    :param directory: каталог снимков, по умолчанию ~/.cache/pyiikocloudapi/snapshots
+    :param keep: сколько последних ревизий хранить для организации
+    :param key: ключ подписи; по умолчанию случайный ключ из файла .snapshot-key в каталоге (создаётся с правами 600)
+    """
+
+    def __init__(self, directory: Optional[str] = None, keep: int = 2, key: Optional[bytes] = None):
+        self.__directory = private_directory(directory if directory is not None
+                                             else user_cache_directory("snapshots"))
+        self.keep = keep
+        self.__key = key if key is not None else self.__load_key()
+
+    def __load_key(self) -> bytes:
+        path = os.path.join(self.__directory, _KEY_FILE)
+        if not os.path.exists(path):
+            # ключ появляется под своим именем уже записанным: другой процесс не прочитает его наполовину
+            fd, tmp_path = tempfile.mkstemp(dir=self.__directory, suffix=".tmp")
+            try:
+                with os.fdopen(fd, "wb") as file:
+                    file.write(secrets.token_bytes(32))
+                os.link(tmp_path, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp_path)
+        with open(path, "rb") as file:
+            key = file.read()
+        if len(key) < 32:
+            raise PermissionError(f"Ключ снимков {path} повреждён")
+        return key
+
+    def __sign(self, data) -> bytes:
+        return hmac.new(self.__key, data, hashlib.sha256).digest()
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    def __folder(self, kind: str, organization_id: str) -> str:
+        return os.path.join(self.__directory, kind, quote(organization_id, safe=""))
+
+    def revisions(self, organization_id: str, kind: str = NOMENCLATURE) -> List[int]:
+        """Сохранённые ревизии организации по возрастанию"""
+        try:
+            names = os.listdir(self.__folder(kind, organization_id))
+        except OSError:
+            return []
+        return sorted(int(name[:-4]) for name in names if name.endswith(".pkl") and name[:-4].isdigit())
+
+    def organizations(self, kind: str = NOMENCLATURE) -> List[str]:
+        try:
+            return [unquote(name) for name in os.listdir(os.path.join(self.__directory, kind))]
+        except OSError:
+            return []
+
+    def save(self, organization_id: str, snapshot: Any, revision: Optional[int] = None,
+             kind: Optional[str] = None) -> str:
+        """
+        Сохранить снимок и вернуть путь к файлу.
+
+        :param organization_id: ID организации
+        :param snapshot: модель, например BaseNomenclatureModel или BaseMenuByIdModel
+        :param revision: ревизия, по умолчанию snapshot.revision, а у моделей без ревизии — текущее время
+        :param kind: вид снимка, по умолчанию имя класса модели
+        """
+        kind = kind if kind is not None else type(snapshot).__name__
+        if revision is None:
+            revision = getattr(snapshot, "revision", None)
+            if revision is None:
+                revision = int(time.time())
+        folder = self.__folder(kind, organization_id)
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        path = os.path.join(folder, f"{revision}.pkl")
+        payload = pickle.dumps({"format": SNAPSHOT_FORMAT, "organization_id": organization_id, "revision": revision,
+                                "snapshot": snapshot}, protocol=5)
+        fd, tmp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(_MAGIC)
+                file.write(self.__sign(payload))
+                file.write(payload)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        if self.keep > 0:
+            for old in self.revisions(organization_id, kind)[:-self.keep]:
+                try:
+                    os.remove(os.path.join(folder, f"{old}.pkl"))
+                except OSError:
+                    pass
+        return path
+
+    def load(self, organization_id: str, kind: str = NOMENCLATURE, revision: Optional[int] = None) -> Optional[Any]:
+        """
+        Загрузить снимок (по умолчанию последней ревизии) или None, если его нет, он несовместим,
+        не принадлежит текущему пользователю или его подпись неверна
+        """
+        if revision is None:
+            revisions = self.revisions(organization_id, kind)
+            if not revisions:
+                return None
+            revision = revisions[-1]
+        path = os.path.join(self.__folder(kind, organization_id), f"{revision}.pkl")
+        header = len(_MAGIC) + _DIGEST_SIZE
+        try:
+            with open(path, "rb") as file:
+                if hasattr(os, "getuid") and os.fstat(file.fileno()).st_uid != os.getuid():
+                    return None
+                with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data, memoryview(data) as view:
+                    if len(view) <= header or view[:len(_MAGIC)] != _MAGIC:
+                        return None
+                    if not hmac.compare_digest(view[len(_MAGIC):header].tobytes(), self.__sign(view[header:])):
+                        return None
+                    payload = pickle.loads(view[header:])
+        except (OSError, ValueError, EOFError, pickle.UnpicklingError, AttributeError, ImportError, TypeError):
+            return None
+        if not isinstance(payload, dict) or payload.get("format") != SNAPSHOT_FORMAT:
+            return None
+        return payload["snapshot"]
+
+    def warm(self, cache: NomenclatureCache, organization_ids: Optional[List[str]] = None) -> List[str]:
+        """
+        Заполнить NomenclatureCache снимками с диска и вернуть организации, для которых снимок нашёлся.
+        Дальше nomenclature_cached догрузит только изменения с сохранённой ревизии.
+        """
+        loaded = []
+        for organization_id in organization_ids if organization_ids is not None else self.organizations():
+            snapshot = self.load(organization_id)
+            if snapshot is not None:
+                cache.put(organization_id, snapshot)
+                loaded.append(organization_id)
+        return loaded
+
+    def save_cache(self, cache: NomenclatureCache) -> List[str]:
+        """Сохранить все снимки NomenclatureCache"""
+        paths = []
+        for organization_id in cache.organizations():
+            snapshot = cache.get(organization_id)
+            if snapshot is not None:
+                paths.append(self.save(organization_id, snapshot, kind=NOMENCLATURE))
+        return paths
@@ -0,0 +1,174 @@
+import re
+from typing import Optional, Dict, List, Tuple, Sequence, Any, Union, get_args
+
+from pydantic import BaseModel
+
+from pyiikocloudapi.models import ByOrderItemModel
+
+# в заказе нужны только скобки и строки, на верхних уровнях ещё ключи и значения
+_DEEP_TOKENS = re.compile(rb'["{}\[\]]')
+_SHALLOW_TOKENS = re.compile(rb'["{}\[\],:]')
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class OrderStreamParser:
+    """
+    Инкрементальный разбор ответа со списком заказов ({"ordersByOrganizations": [{"orders": [...]}]}).
+
+    feed() принимает очередной кусок тела и возвращает байты заказов, которые в нём закончились;
+    в памяти держится только недочитанный заказ. Скалярные поля верхнего уровня
+    (maxRevision, correlationId, errorDescription, ...) собираются в scalars.
+    """
+
+    def __init__(self):
+        self.__buffer = bytearray()
+        self.__position = 0
+        # (скобка, ключ в родителе, ожидается ключ)
+        self.__stack: List[List[Any]] = []
+        self.__key: Optional[str] = None
+        self.__order_start: Optional[int] = None
+        self.__order_depth = 0
+        self.__value_start: Optional[int] = None
+        self.__done = False
+        self.scalars: Dict[str, bytes] = {}
+
+    @property
+    def done(self) -> bool:
+        """Корневой объект закрыт"""
+        return self.__done
+
+    def __in_orders(self) -> bool:
+        stack = self.__stack
+        return len(stack) == 4 and stack[3][0] == b"[" and stack[3][1] == "orders" \
+            and stack[1][1] == "ordersByOrganizations"
+
+    def __string_end(self, start: int) -> int:
+        """Позиция закрывающей кавычки строки, начатой в start, или -1, если строка ещё не дочитана"""
+        buffer = self.__buffer
+        end = start
+        while True:
+            end = buffer.find(b'"', end + 1)
+            if end < 0:
+                return -1
+            backslashes = 0
+            while buffer[end - 1 - backslashes] == 0x5c:
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return end
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        orders: List[bytes] = []
+        buffer = self.__buffer
+        buffer += chunk
+        position = self.__position
+        stack = self.__stack
+        while not self.__done:
+            if self.__order_start is not None:
+                match = _DEEP_TOKENS.search(buffer, position)
+            else:
+                match = _SHALLOW_TOKENS.search(buffer, position)
+            if match is None:
+                position = len(buffer)
+                break
+            index = match.start()
+            token = buffer[index:index + 1]
+            if token == b'"':
+                end = self.__string_end(index)
+                if end < 0:
+                    position = index
+                    break
+                if self.__order_start is None and stack and stack[-1][0] == b"{" and stack[-1][2]:
+                    self.__key = buffer[index + 1:end].decode("utf-8")
+                position = end + 1
+                continue
+            position = index + 1
+            if self.__order_start is not None:
+                if token in (b"{", b"["):
+                    self.__order_depth += 1
+                elif token in (b"}", b"]"):
+                    self.__order_depth -= 1
+                    if self.__order_depth == 0:
+                        orders.append(bytes(buffer[self.__order_start:position]))
+                        self.__order_start = None
+                continue
+            if token in (b"{", b"["):
+                if token == b"{" and self.__in_orders():
+                    self.__order_start = index
+                    self.__order_depth = 1
+                    continue
+                key = self.__key if stack and stack[-1][0] == b"{" else None
+                stack.append([token, key, token == b"{"])
+                self.__key = None
+                self.__value_start = None
+            elif token in (b"}", b"]"):
+                self.__close_value(index)
+                stack.pop()
+                if not stack:
+                    self.__done = True
+            elif token == b":":
+                stack[-1][2] = False
+                if len(stack) == 1:
+                    self.__value_start = position
+            elif token == b",":
+                self.__close_value(index)
+                if stack[-1][0] == b"{":
+                    stack[-1][2] = True
+        # прочитанное больше не нужно: оставляем только начатый заказ или незакрытое значение
+        keep = min(i for i in (self.__order_start, self.__value_start, position) if i is not None)
+        if keep:
+            del buffer[:keep]
+            position -= keep
+            if self.__order_start is not None:
+                self.__order_start -= keep
+            if self.__value_start is not None:
+                self.__value_start -= keep
+        self.__position = position
+        return orders
+
+    def __close_value(self, index: int):
+        if self.__value_start is not None and len(self.__stack) == 1 and self.__key is not None:
+            self.scalars[self.__key] = bytes(self.__buffer[self.__value_start:index]).strip()
+        self.__value_start = None
+        self.__key = None
+
+
+def _field_type(annotation) -> Optional[type]:
+    """Модель внутри Optional[...] / List[...] или None"""
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+        return annotation
+    for argument in get_args(annotation):
+        model = _field_type(argument)
+        if model is not None:
+            return model
+    return None
+
+
+def resolve_fields(fields: Sequence[str], model=ByOrderItemModel) -> List[Tuple[str, Tuple[str, ...]]]:
+    """
+    Пути полей модели ("id", "order.status", "order.courier_info.courier.id") в пути по ключам JSON.
+    Неизвестное поле - ValueError.
+    """
+    resolved = []
+    for field in fields:
+        current = model
+        path = []
+        for name in field.split("."):
+            info = current.model_fields.get(name) if current is not None else None
+            if info is None:
+                raise ValueError(f"Неизвестное поле {field!r}")
+            path.append(info.alias or name)
+            current = _field_type(info.annotation)
+        resolved.append((field, tuple(path)))
+    return resolved
+
+
+def project(data: dict, fields: List[Tuple[str, Tuple[str, ...]]]) -> Dict[str, Any]:
+    """Выбрать из заказа (dict) поля resolve_fields(); отсутствующее значение - None"""
+    out = {}
+    for name, path in fields:
+        value: Union[dict, Any] = data
+        for key in path:
+            value = value.get(key) if isinstance(value, dict) else None
+        out[name] = value
+    return out
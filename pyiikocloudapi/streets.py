@@ -0,0 +1,178 @@
+import os
+import re
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from typing import Optional, Dict, List, Tuple, Union
+from urllib.parse import quote
+
+from pyiikocloudapi.models import BaseStreetByCityModel, StreetsItemModel, CustomErrorModel
+
+_SEPARATORS = re.compile(r"[\s.,\-/()«»\"']+")
+
+
+def normalize_street_name(name: str) -> str:
+    """Название улицы для поиска: без регистра, ё -> е, знаки препинания и лишние пробелы убраны"""
+    return _SEPARATORS.sub(" ", name.casefold().replace("ё", "е")).strip()
+
+
+class StreetIndex:
+    """
+    Отсортированный индекс улиц города для поиска по префиксу (bisect).
+
+    Улица находится по началу любого слова названия: "лен" найдёт и "Ленина", и "проспект Ленинский".
+    """
+
+    def __init__(self, streets: List[StreetsItemModel], include_deleted: bool = False):
+        self.streets: Dict[str, StreetsItemModel] = {}
+        entries: List[Tuple[str, str]] = []
+        for street in streets:
+            if street.is_deleted and not include_deleted:
+                continue
+            self.streets[street.id] = street
+            words = normalize_street_name(street.name).split(" ")
+            for position in range(len(words)):
+                entries.append((" ".join(words[position:]), street.id))
+        entries.sort()
+        self.__keys = [key for key, _ in entries]
+        self.__ids = [street_id for _, street_id in entries]
+
+    def __len__(self):
+        return len(self.streets)
+
+    def get(self, street_id: str) -> Optional[StreetsItemModel]:
+        return self.streets.get(street_id)
+
+    def search(self, prefix: str, limit: int = 20) -> List[StreetsItemModel]:
+        """Улицы, название которых (или одно из его слов) начинается с prefix"""
+        prefix = normalize_street_name(prefix)
+        found: Dict[str, StreetsItemModel] = {}
+        position = bisect_left(self.__keys, prefix)
+        while position < len(self.__keys) and len(found) < limit and self.__keys[position].startswith(prefix):
+            street_id = self.__ids[position]
+            if street_id not in found:
+                found[street_id] = self.streets[street_id]
+            position += 1
+        return list(found.values())
+
+
+class StreetDirectory:
+    """
+    Справочник улиц по (организация, город): в памяти и на диске, обновляется раз в ttl секунд.
+
+    index() / search() возвращают результат сразу, если улицы города уже загружены,
+    иначе читают файл или запрашивают by_city; в асинхронном клиенте результат нужно дождаться (await).
+
+    :param api: IikoTransport или AsyncIikoTransport
+    :param directory: каталог для файлов улиц, None - хранить только в памяти
+    :param ttl: через сколько секунд улицы города запрашиваются заново
+    :param include_deleted: искать и среди удалённых улиц
+    """
+
+    def __init__(self, api, directory: Optional[str] = None, ttl: float = 24 * 60 * 60,
+                 include_deleted: bool = False):
+        self.__api = api
+        self.__directory = directory
+        self.ttl = ttl
+        self.include_deleted = include_deleted
+        self.__indexes: Dict[Tuple[str, str], Tuple[StreetIndex, float]] = {}
+        self.__lock = threading.Lock()
+        if directory is not None:
+            os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def __path(self, organization_id: str, city_id: str) -> Optional[str]:
+        if self.__directory is None:
+            return None
+        return os.path.join(self.__directory, quote(organization_id, safe=""), f"{quote(city_id, safe='')}.json")
+
+    def __cached(self, organization_id: str, city_id: str) -> Optional[StreetIndex]:
+        with self.__lock:
+            cached = self.__indexes.get((organization_id, city_id))
+        if cached is not None and time.time() - cached[1] < self.ttl:
+            return cached[0]
+        path = self.__path(organization_id, city_id)
+        if path is None:
+            return None
+        try:
+            loaded_at = os.path.getmtime(path)
+            if time.time() - loaded_at >= self.ttl:
+                return None
+            with open(path, "rb") as file:
+                streets = BaseStreetByCityModel.model_validate_json(file.read())
+        except (OSError, ValueError):
+            return None
+        return self.__remember(organization_id, city_id, streets, loaded_at)
+
+    def __remember(self, organization_id: str, city_id: str, streets: BaseStreetByCityModel,
+                   loaded_at: float) -> StreetIndex:
+        index = StreetIndex(streets.streets or [], include_deleted=self.include_deleted)
+        with self.__lock:
+            self.__indexes[(organization_id, city_id)] = (index, loaded_at)
+        return index
+
+    def __save(self, organization_id: str, city_id: str, streets: BaseStreetByCityModel):
+        path = self.__path(organization_id, city_id)
+        if path is None:
+            return
+        os.makedirs(os.path.dirname(path), mode=0o700, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                file.write(streets.model_dump_json(by_alias=True))
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def index(self, organization_id: str, city_id: str) -> Union[StreetIndex, CustomErrorModel]:
+        """Индекс улиц города (ошибка iiko возвращается как есть и не кэшируется)"""
+        index = self.__cached(organization_id, city_id)
+        if index is not None:
+            return self.__api._ready(index)
+
+        def loaded(response):
+            if isinstance(response, CustomErrorModel):
+                return response
+            if isinstance(response, dict):
+                response = BaseStreetByCityModel.model_validate(response)
+            self.__save(organization_id, city_id, response)
+            return self.__remember(organization_id, city_id, response, time.time())
+
+        return self.__api._then(self.__api.by_city(organization_id, city_id), loaded)
+
+    def search(self, organization_id: str, city_id: str, prefix: str,
+               limit: int = 20) -> Union[List[StreetsItemModel], CustomErrorModel]:
+        """Поиск улиц города по началу названия"""
+
+        def found(index):
+            if isinstance(index, CustomErrorModel):
+                return index
+            return index.search(prefix, limit)
+
+        return self.__api._then(self.index(organization_id, city_id), found)
+
+    def invalidate(self, organization_id: Optional[str] = None, city_id: Optional[str] = None):
+        """Забыть улицы (всех городов организации или всех вообще), файлы тоже удаляются"""
+        with self.__lock:
+            keys = [key for key in self.__indexes
+                    if (organization_id is None or key[0] == organization_id)
+                    and (city_id is None or key[1] == city_id)]
+            for key in keys:
+                del self.__indexes[key]
+        if self.__directory is None:
+            return
+        folders = [quote(organization_id, safe="")] if organization_id is not None else os.listdir(self.__directory)
+        for folder in folders:
+            folder = os.path.join(self.__directory, folder)
+            try:
+                names = os.listdir(folder)
+            except OSError:
+                continue
+            for name in names:
+                if name.endswith(".json") and (city_id is None or name == f"{quote(city_id, safe='')}.json"):
+                    try:
+                        os.remove(os.path.join(folder, name))
+                    except OSError:
+                        pass
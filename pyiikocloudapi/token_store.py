@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+import threading
+from contextlib import contextmanager
+from typing import Optional, Tuple, Dict
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+    import msvcrt
+
+
+def user_cache_directory(*parts: str) -> str:
+    """Каталог в кэше текущего пользователя: $XDG_CACHE_HOME или ~/.cache, затем pyiikocloudapi/parts"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "pyiikocloudapi", *parts)
+
+
+def private_directory(directory: str) -> str:
+    """
+    Создать каталог с правами 0o700 и проверить, что он принадлежит текущему пользователю
+    и недоступен остальным; иначе PermissionError. Возвращает абсолютный путь.
+    """
+    directory = os.path.abspath(directory)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.lstat(directory)
+    if stat.S_ISLNK(info.st_mode) or not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"{directory} не является каталогом")
+    if hasattr(os, "getuid"):
+        if info.st_uid != os.getuid():
+            raise PermissionError(f"Каталог {directory} принадлежит другому пользователю")
+        if info.st_mode & 0o077:
+            raise PermissionError(f"Каталог {directory} доступен другим пользователям "
+                                  f"(права {stat.S_IMODE(info.st_mode):o}, нужно 700)")
+    return directory
+
+
+class BaseTokenStore:
+    """
+    Хранилище маркеров доступа, общее для нескольких клиентов, ключ — api_login.
+
+    Для своего бэкенда (например Redis) достаточно реализовать get, set и lock:
+    lock должен блокировать обновление маркера для api_login во всех процессах,
+    которые пользуются хранилищем (в Redis — SET NX с истечением).
+    """
+
+    def get(self, api_login: str) -> Optional[Tuple[str, float]]:
+        """Вернуть (маркер, время получения в секундах epoch) или None"""
+        raise NotImplementedError
+
+    def set(self, api_login: str, token: str, issued_at: float):
+        """Сохранить маркер и время его получения"""
+        raise NotImplementedError
+
+    def lock(self, api_login: str):
+        """Контекстный менеджер, на время которого маркер для api_login обновляет только один владелец"""
+        raise NotImplementedError
+
+
+class MemoryTokenStore(BaseTokenStore):
+    """Хранилище в памяти процесса: один маркер на api_login для всех клиентов процесса"""
+
+    def __init__(self):
+        self.__tokens: Dict[str, Tuple[str, float]] = {}
+        self.__locks: Dict[str, threading.Lock] = {}
+        self.__guard = threading.Lock()
+
+    def get(self, api_login: str) -> Optional[Tuple[str, float]]:
+        return self.__tokens.get(api_login)
+
+    def set(self, api_login: str, token: str, issued_at: float):
+        self.__tokens[api_login] = (token, issued_at)
+
+    def lock(self, api_login: str):
+        with self.__guard:
+            # threading.Lock, а не RLock: асинхронный клиент может освободить его из другого потока
+            return self.__locks.setdefault(api_login, threading.Lock())
+
+
+class FileTokenStore(BaseTokenStore):
+    """
+    Хранилище в каталоге на диске, общее для всех процессов узла (воркеры gunicorn, cron).
+
+    Маркер каждого api_login лежит в отдельном json-файле, обновление защищено блокировкой файла (flock).
+    Имя файла — sha256 от api_login, сам логин на диск не пишется.
+    Каталог должен принадлежать текущему пользователю и иметь права 700, иначе PermissionError.
+
+    :param directory: каталог маркеров, по умолчанию ~/.cache/pyiikocloudapi/tokens
+    """
+
+    def __init__(self, directory: Optional[str] = None):
+        self.__directory = private_directory(directory if directory is not None
+                                             else user_cache_directory("tokens"))
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    def __path(self, api_login: str, suffix: str) -> str:
+        name = hashlib.sha256(api_login.encode("utf-8")).hexdigest()
+        return os.path.join(self.__directory, f"{name}{suffix}")
+
+    def get(self, api_login: str) -> Optional[Tuple[str, float]]:
+        try:
+            with open(self.__path(api_login, ".json"), "r", encoding="utf-8") as file:
+                data = json.load(file)
+            return data["token"], float(data["issued_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def set(self, api_login: str, token: str, issued_at: float):
+        path = self.__path(api_login, ".json")
+        fd, tmp_path = tempfile.mkstemp(dir=self.__directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as file:
+                json.dump({"token": token, "issued_at": issued_at}, file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @contextmanager
+    def lock(self, api_login: str):
+        with open(self.__path(api_login, ".lock"), "a+b") as file:
+            if fcntl is not None:
+                fcntl.flock(file.fileno(), fcntl.LOCK_EX)
+            else:  # pragma: no cover - Windows
+                file.seek(0)
+                msvcrt.locking(file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(file.fileno(), fcntl.LOCK_UN)
+                else:  # pragma: no cover - Windows
+                    file.seek(0)
+                    msvcrt.locking(file.fileno(), msvcrt.LK_UNLCK, 1)
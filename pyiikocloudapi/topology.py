@@ -0,0 +1,195 @@
+import asyncio
+import inspect
+import logging
+import threading
+import weakref
+from typing import Optional, Dict, List, Callable, Union
+
+from pyiikocloudapi.models import BaseOrganizationsModel, BaseTerminalGroupsModel, OrganizationModel, \
+    TerminalGroupItemModel, CustomErrorModel
+
+
+class Topology:
+    """Снимок организаций и их групп терминалов с индексами по id"""
+
+    def __init__(self, organizations: List[OrganizationModel], terminal_groups: List[TerminalGroupItemModel]):
+        self.organizations: Dict[str, OrganizationModel] = {org.id: org for org in organizations}
+        self.terminal_groups: Dict[str, TerminalGroupItemModel] = {}
+        self.__by_organization: Dict[str, List[TerminalGroupItemModel]] = {org_id: [] for org_id in self.organizations}
+        for terminal_group in terminal_groups:
+            self.terminal_groups[terminal_group.id] = terminal_group
+            self.__by_organization.setdefault(terminal_group.organization_id, []).append(terminal_group)
+
+    @classmethod
+    def from_responses(cls, organizations: Union[BaseOrganizationsModel, dict],
+                       terminal_groups: Union[BaseTerminalGroupsModel, dict, None]) -> "Topology":
+        """Собрать снимок из ответов organizations и terminal_groups (модели или dict при return_dict)"""
+        if isinstance(organizations, dict):
+            organizations = BaseOrganizationsModel.model_validate(organizations)
+        if isinstance(terminal_groups, dict):
+            terminal_groups = BaseTerminalGroupsModel.model_validate(terminal_groups)
+        items = []
+        if terminal_groups is not None:
+            for group in terminal_groups.terminal_groups or []:
+                items.extend(group.items or [])
+        return cls(organizations.organizations, items)
+
+    def organization(self, organization_id: str) -> Optional[OrganizationModel]:
+        return self.organizations.get(organization_id)
+
+    def terminal_group(self, terminal_group_id: str) -> Optional[TerminalGroupItemModel]:
+        return self.terminal_groups.get(terminal_group_id)
+
+    def terminal_groups_of(self, organization_id: str) -> List[TerminalGroupItemModel]:
+        return list(self.__by_organization.get(organization_id, []))
+
+    def organization_of(self, terminal_group_id: str) -> Optional[OrganizationModel]:
+        """Организация группы терминалов"""
+        terminal_group = self.terminal_groups.get(terminal_group_id)
+        return self.organizations.get(terminal_group.organization_id) if terminal_group is not None else None
+
+
+class TopologyChange:
+    """Что изменилось при обновлении топологии"""
+
+    def __init__(self, old: Optional[Topology], new: Topology):
+        self.old = old
+        self.new = new
+        old_orgs = old.organizations if old is not None else {}
+        old_groups = old.terminal_groups if old is not None else {}
+        self.added_organizations = [org for org_id, org in new.organizations.items() if org_id not in old_orgs]
+        self.removed_organizations = [org for org_id, org in old_orgs.items() if org_id not in new.organizations]
+        self.changed_organizations = [org for org_id, org in new.organizations.items()
+                                      if org_id in old_orgs and old_orgs[org_id] != org]
+        self.added_terminal_groups = [tg for tg_id, tg in new.terminal_groups.items() if tg_id not in old_groups]
+        self.removed_terminal_groups = [tg for tg_id, tg in old_groups.items() if tg_id not in new.terminal_groups]
+        self.changed_terminal_groups = [tg for tg_id, tg in new.terminal_groups.items()
+                                        if tg_id in old_groups and old_groups[tg_id] != tg]
+
+    def is_empty(self) -> bool:
+        return not (self.added_organizations or self.removed_organizations or self.changed_organizations
+                    or self.added_terminal_groups or self.removed_terminal_groups or self.changed_terminal_groups)
+
+
+class TopologyCache:
+    """
+    Кэш топологии организации -> группы терминалов с периодическим обновлением в фоне.
+
+    refresh() запрашивает organizations и terminal_groups и заменяет снимок целиком; в асинхронном клиенте
+    refresh() — корутина, а фоновое обновление идёт задачей asyncio. Подписчики (subscribe) получают
+    TopologyChange, только если что-то изменилось. Работает одинаково при return_dict=True и False.
+
+    :param api: IikoTransport или AsyncIikoTransport
+    :param refresh_interval: период фонового обновления, сек.
+    :param include_disabled: учитывать отключённые организации и группы терминалов
+    """
+
+    def __init__(self, api, refresh_interval: float = 600, include_disabled: bool = False):
+        self.__api = api
+        self.refresh_interval = refresh_interval
+        self.include_disabled = include_disabled
+        self.__topology: Optional[Topology] = None
+        self.__listeners: List[Callable[[TopologyChange], None]] = []
+        self.__lock = threading.Lock()
+        self.__timer: Optional[threading.Timer] = None
+        self.__task: Optional[asyncio.Task] = None
+        self.logger: logging.Logger = api.logger
+
+    @property
+    def topology(self) -> Optional[Topology]:
+        """Последний снимок или None, если refresh ещё не выполнялся"""
+        return self.__topology
+
+    @property
+    def is_async(self) -> bool:
+        return inspect.iscoroutinefunction(self.__api._post_request)
+
+    def subscribe(self, listener: Callable[[TopologyChange], None]):
+        self.__listeners.append(listener)
+
+    def unsubscribe(self, listener: Callable[[TopologyChange], None]):
+        if listener in self.__listeners:
+            self.__listeners.remove(listener)
+
+    def refresh(self):
+        """Запросить топологию и вернуть новый снимок (при ошибке iiko остаётся прежний)"""
+        api = self.__api
+
+        def with_organizations(organizations):
+            if isinstance(organizations, CustomErrorModel):
+                self.logger.warning("Не удалось обновить организации: %s", organizations.error_description)
+                return self.__topology
+            if isinstance(organizations, dict):
+                organizations = BaseOrganizationsModel.model_validate(organizations)
+            organization_ids = organizations.__list_id__()
+            if not organization_ids:
+                return self.__update(Topology.from_responses(organizations, None))
+
+            def with_terminal_groups(terminal_groups):
+                if isinstance(terminal_groups, CustomErrorModel):
+                    self.logger.warning("Не удалось обновить группы терминалов: %s",
+                                        terminal_groups.error_description)
+                    return self.__topology
+                return self.__update(Topology.from_responses(organizations, terminal_groups))
+
+            return api._then(api.terminal_groups(organization_ids, include_disabled=self.include_disabled),
+                             with_terminal_groups)
+
+        return api._then(api.organizations(include_disabled=self.include_disabled or None), with_organizations)
+
+    def __update(self, topology: Topology) -> Topology:
+        with self.__lock:
+            change = TopologyChange(self.__topology, topology)
+            self.__topology = topology
+        if not change.is_empty():
+            for listener in list(self.__listeners):
+                try:
+                    listener(change)
+                except Exception as err:
+                    self.logger.warning("Ошибка подписчика топологии: %s", err)
+        return topology
+
+    def start(self):
+        """Запустить фоновое обновление каждые refresh_interval секунд (в асинхронном клиенте — из цикла событий)"""
+        self.stop()
+        if self.is_async:
+            self.__task = asyncio.get_running_loop().create_task(self.__refresh_loop())
+        else:
+            self.__schedule()
+
+    def stop(self):
+        timer, self.__timer = self.__timer, None
+        if timer is not None:
+            timer.cancel()
+        task, self.__task = self.__task, None
+        if task is not None:
+            task.cancel()
+
+    def __schedule(self):
+        # таймер держит только слабую ссылку, чтобы не продлевать жизнь кэша
+        cache_ref = weakref.ref(self)
+
+        def tick():
+            cache = cache_ref()
+            if cache is None or cache.__timer is None:
+                return
+            try:
+                cache.refresh()
+            except Exception as err:
+                cache.logger.warning("Не удалось обновить топологию в фоне: %s", err)
+            if cache.__timer is not None:
+                cache.__schedule()
+
+        self.__timer = threading.Timer(self.refresh_interval, tick)
+        self.__timer.daemon = True
+        self.__timer.start()
+
+    async def __refresh_loop(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh()
+            except asyncio.CancelledError:
+                raise
+            except Exception as err:
+                self.logger.warning("Не удалось обновить топологию в фоне: %s", err)
@@ -20,6 +20,12 @@ setup(
         'Tracker': 'https://github.com/kebrick/pyiikocloupapi/issues',
     },
     install_requires=['requests', 'pydantic'],
+    extras_require={
+        'async': ['httpx'],
+        'http2': ['httpx[http2]'],
+        'orjson': ['orjson'],
+        'numpy': ['numpy'],
+    },
 
     python_requires='>=3.7',
     zip_safe=False
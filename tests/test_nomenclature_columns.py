@@ -0,0 +1,56 @@
+import unittest
+
+from pyiikocloudapi.models import BaseNomenclatureModel
+from pyiikocloudapi.nomenclature import nomenclature_columns, NUTRITION_COLUMNS
+
+NUTRITION = {
+    "weight": 0.25,
+    "fatAmount": 1.0,
+    "proteinsAmount": 2.0,
+    "carbohydratesAmount": 3.0,
+    "energyAmount": 4.0,
+    "fatFullAmount": 5.0,
+    "proteinsFullAmount": 6.0,
+    "carbohydratesFullAmount": 7.0,
+    "energyFullAmount": 8.0,
+}
+
+
+def product(product_id: str, price: float, **fields) -> dict:
+    return {
+        "id": product_id, "name": product_id, "orderItemType": "Product", "splittable": False,
+        "measureUnit": "шт", "modifiers": [], "groupModifiers": [], "imageLinks": [],
+        "doNotPrintInCheque": False, "order": 0, "useBalanceForSell": False, "canSetOpenPrice": False,
+        "sizePrices": [{"sizeId": None, "price": {"currentPrice": price, "isIncludedInMenu": True,
+                                                  "nextIncludedInMenu": True}}],
+        **fields,
+    }
+
+
+class NomenclatureColumnsTest(unittest.TestCase):
+    def test_nutrition_values_match_json_fields(self):
+        nomenclature = BaseNomenclatureModel.model_validate({
+            "correlationId": "c", "groups": [], "productCategories": [], "sizes": [], "revision": 1,
+            "products": [product("a", 10.0, **NUTRITION)],
+        })
+        columns = nomenclature_columns(nomenclature)
+        expected = {
+            "weight": 0.25,
+            "fat_amount": 1.0,
+            "proteins_amount": 2.0,
+            "carbohydrates_amount": 3.0,
+            "energy_amount": 4.0,
+            "fat_full_amount": 5.0,
+            "proteins_full_amount": 6.0,
+            "carbohydrates_full_amount": 7.0,
+            "energy_full_amount": 8.0,
+        }
+        self.assertEqual(set(expected), set(NUTRITION_COLUMNS))
+        for column, value in expected.items():
+            self.assertEqual(columns[column], [value], column)
+        self.assertEqual(columns["product_id"], ["a"])
+        self.assertEqual(columns["current_price"], [10.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
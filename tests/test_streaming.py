@@ -0,0 +1,64 @@
+import json
+import unittest
+
+from pyiikocloudapi.streaming import OrderStreamParser
+
+ORDERS = [
+    {"id": "a", "order": {"comment": "скобки } ] { [ и \"кавычки\" \\", "items": [{"amount": 1}]}},
+    {"id": "b", "order": None, "errorInfo": {"code": "x", "message": "\\\"}"}},
+]
+
+BODY = json.dumps({
+    "correlationId": "c",
+    "maxRevision": 42,
+    "ordersByOrganizations": [
+        {"organizationId": "o1", "orders": ORDERS},
+        {"organizationId": "o2", "orders": []},
+    ],
+}, ensure_ascii=False).encode("utf-8")
+
+
+def parse(body: bytes, size: int):
+    parser = OrderStreamParser()
+    orders = []
+    for start in range(0, len(body), size):
+        orders.extend(parser.feed(body[start:start + size]))
+    return parser, orders
+
+
+class OrderStreamParserTest(unittest.TestCase):
+    def test_orders_match_json_for_any_chunk_size(self):
+        for size in (1, 2, 3, 7, 64, len(BODY)):
+            parser, orders = parse(BODY, size)
+            self.assertTrue(parser.done, size)
+            self.assertEqual([json.loads(order) for order in orders], ORDERS, size)
+            self.assertEqual(parser.scalars["maxRevision"], b"42", size)
+            self.assertEqual(json.loads(parser.scalars["correlationId"]), "c", size)
+
+    def test_error_description_scalar(self):
+        body = json.dumps({"correlationId": "c", "errorDescription": "Организация \"o\" не найдена",
+                           "error": "NOT_FOUND"}, ensure_ascii=False).encode("utf-8")
+        for size in (1, 5, len(body)):
+            parser, orders = parse(body, size)
+            self.assertTrue(parser.done)
+            self.assertEqual(orders, [])
+            self.assertEqual(json.loads(parser.scalars["errorDescription"]), "Организация \"o\" не найдена")
+
+    def test_truncated_body_is_not_done(self):
+        cut = BODY.index(b'{"id": "b"') + 5
+        parser, orders = parse(BODY[:cut], 3)
+        self.assertFalse(parser.done)
+        self.assertEqual([json.loads(order) for order in orders], ORDERS[:1])
+
+    def test_null_orders(self):
+        body = b'{"correlationId": "c", "maxRevision": 1, ' \
+               b'"ordersByOrganizations": [{"organizationId": "o", "orders": null}]}'
+        for size in (1, 4, len(body)):
+            parser, orders = parse(body, size)
+            self.assertTrue(parser.done)
+            self.assertEqual(orders, [])
+            self.assertEqual(parser.scalars["maxRevision"], b"1")
+
+
+if __name__ == "__main__":
+    unittest.main()